@@ -0,0 +1,348 @@
+"""
+爬虫离线基准 / 解析后端对比工具
+
+用法:
+    python bench.py record                                    # 把线上页面录制到 fixtures/
+    python bench.py run                                       # 用录制的页面对每个提取函数和 main() 计时
+    python bench.py run --save base.json                      # 保存本次结果作为基线
+    python bench.py run --baseline base.json                  # 与基线对比
+    python bench.py parsers                                   # 直接抓取线上页面
+    python bench.py parsers --fixtures fixtures               # 使用录制的页面
+    python bench.py parsers --4d4d a.html --4dlatest b.html   # 使用保存好的页面
+
+record 子命令抓取 4d4d.co、4dlatest.org、4d2ulive.com 以及 Singapore Pools
+列表页和详情页，按 URL 保存到录制目录（fixtures/index.json 记录 URL -> 文件）。
+仓库里提交的 fixtures/ 是按各提取函数依赖的页面结构整理的精简匿名页面（号码取自
+2026-03-07 的已保存结果），不联网也能直接 run / parsers；重新 record 会覆盖它们，
+提交前请确认 tests/ 仍然通过。
+
+run 子命令在不访问网络的情况下回放录制的页面，对 extract_global_date、每个
+outerbox 提取函数、各 *_from_4dlatest 函数、整页提取以及完整的 main() 流程计时，
+输出每个函数的中位耗时和峰值内存（tracemalloc 单独跑一次测得，不影响计时）。
+main() 每次都在新的临时目录中以 force 模式运行，测的是冷启动的完整流程。
+
+parsers 子命令用每个已安装的解析后端解析同一份 HTML，检查每家公司的提取结果
+与 html.parser 完全一致，并输出各后端的解析 / 提取耗时。存在差异时退出码为 1。
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from bs4.builder import builder_registry
+
+import crawler
+
+BACKENDS = ["html.parser", "lxml", "html5lib"]
+REFERENCE_BACKEND = "html.parser"
+FIXTURES_DIR = "fixtures"
+
+# 数据源名称 -> (线上地址, 提取函数(soup) -> {公司: 数据})
+SOURCES = {
+    "4d4d": (crawler.URL_4D4D, crawler.extract_4d4d_page),
+    "4dlatest": (crawler.URL_4DLATEST, crawler.extract_4dlatest_page),
+    "4d2ulive": (crawler.URL_4D2ULIVE, lambda soup: {"grand_dragon": crawler.extract_grand_dragon_from_4d2ulive(soup)}),
+}
+
+
+def available_backends():
+    return [name for name in BACKENDS if builder_registry.lookup(name)]
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽提取函数的进度输出，避免干扰计时"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def load_pages(args):
+    if args.fixtures:
+        crawler.use_fixtures(args.fixtures)
+    pages = {}
+    for name, (url, _) in SOURCES.items():
+        path = getattr(args, "page_" + name)
+        if path:
+            with open(path, encoding="utf-8") as f:
+                pages[name] = f.read()
+        elif args.fixtures or not args.offline:
+            with quiet():
+                html = crawler.fetch_html(url)
+            if html:
+                pages[name] = html
+    return pages
+
+
+def time_backend(backend, html, extract, repeat):
+    parse_times, extract_times = [], []
+    results = None
+    for _ in range(repeat):
+        with quiet():
+            t0 = time.perf_counter()
+            soup = crawler.make_soup(html, backend)
+            t1 = time.perf_counter()
+            results = extract(soup)
+            t2 = time.perf_counter()
+        parse_times.append(t1 - t0)
+        extract_times.append(t2 - t1)
+    return results, statistics.median(parse_times), statistics.median(extract_times)
+
+
+def cmd_parsers(args):
+    backends = available_backends()
+    missing = [b for b in BACKENDS if b not in backends]
+    if missing:
+        print(f"ℹ️ 未安装的后端（跳过）: {', '.join(missing)}")
+    pages = load_pages(args)
+    if not pages:
+        print("❌ 没有可用的页面")
+        return 1
+
+    mismatches = 0
+    for name, html in pages.items():
+        extract = SOURCES[name][1]
+        print(f"\n📄 {name} ({len(html) / 1024:.0f} KB)")
+        print(f"  {'backend':<12} {'parse ms':>10} {'extract ms':>11} {'total ms':>10}  一致性")
+        reference = None
+        for backend in [REFERENCE_BACKEND] + [b for b in backends if b != REFERENCE_BACKEND]:
+            crawler.HTML_PARSER = backend
+            results, parse_s, extract_s = time_backend(backend, html, extract, args.repeat)
+            if reference is None:
+                reference = results
+                verdict = "基准"
+            else:
+                diff = sorted(k for k in set(reference) | set(results) if reference.get(k) != results.get(k))
+                verdict = "✅ 一致" if not diff else f"❌ 不一致: {', '.join(diff)}"
+                mismatches += bool(diff)
+            print(f"  {backend:<12} {parse_s * 1000:>10.1f} {extract_s * 1000:>11.1f} "
+                  f"{(parse_s + extract_s) * 1000:>10.1f}  {verdict}")
+    crawler.HTML_PARSER = REFERENCE_BACKEND
+    return 1 if mismatches else 0
+
+
+# ---------- 录制 ----------
+def fixture_name(url):
+    """按 URL 生成文件名，带查询参数的页面（如 TOTO 详情页）附加摘要区分"""
+    parts = urlsplit(url)
+    name = (parts.netloc + parts.path).strip("/").replace("/", "_") or parts.netloc
+    if parts.query:
+        name += "_" + hashlib.sha1(parts.query.encode()).hexdigest()[:8]
+    return name + ".html"
+
+
+def cmd_record(args):
+    os.makedirs(args.out, exist_ok=True)
+    index_path = os.path.join(args.out, crawler.FIXTURE_INDEX)
+    index = crawler.load_state(index_path)
+    original = crawler.http_get
+
+    def recording_get(url, **kwargs):
+        kwargs.pop("headers", None)   # 不带条件请求头，保证录到完整页面
+        r = original(url, **kwargs)
+        if r.status_code == 200:
+            name = fixture_name(url)
+            with open(os.path.join(args.out, name), "wb") as f:
+                f.write(r.content)
+            index[url] = name
+            print(f"💾 {url} -> {name} ({len(r.content) / 1024:.0f} KB)")
+        return r
+
+    crawler.http_get = recording_get
+    try:
+        for url, _ in SOURCES.values():
+            crawler.fetch_html(url)
+        crawler.fetch_singapore_toto_from_official(force=True)
+    finally:
+        crawler.http_get = original
+    if not index:
+        print("❌ 没有录制到任何页面")
+        return 1
+    crawler.save_state(index_path, index)
+    print(f"📼 已录制 {len(index)} 个页面到 {args.out}")
+    return 0
+
+
+# ---------- 基准 ----------
+def reset_run_state():
+    """清空 crawler 模块里跨一次运行保留的状态，使每次 main() 都从零开始"""
+    crawler._fetch_state = None
+    crawler._circuit = None
+    crawler._fetch_state_updates.clear()
+    crawler._touched_dates.clear()
+    crawler._lookup_shards.clear()
+    crawler._lookup_dirty.clear()
+    crawler._file_digests.clear()
+    crawler._written_paths.clear()
+    crawler._deleted_paths.clear()
+    crawler._pending_appends.clear()
+    crawler._pending_deletes.clear()
+    crawler._live_events.clear()
+    crawler._live_seq.clear()
+    crawler._source_results = None
+
+
+@contextlib.contextmanager
+def fresh_workdir():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="crawler-bench-") as tmp:
+        os.chdir(tmp)
+        reset_run_state()
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+
+def measure(func, repeat, workdir=False):
+    """返回 (中位耗时秒, 最小耗时秒, 峰值内存字节)；workdir=True 时每次在新的临时目录中运行"""
+    scope = fresh_workdir if workdir else contextlib.nullcontext
+    times = []
+    for _ in range(repeat):
+        with scope(), quiet():
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+    with scope(), quiet():
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return statistics.median(times), min(times), peak
+
+
+def benchmark_cases():
+    """[(名称, 调用次数, 函数)]，页面只解析一次，提取函数在同一棵树上反复计时"""
+    pages = {}
+    with quiet():
+        for name, (url, _) in SOURCES.items():
+            pages[name] = crawler.fetch_html(url)
+        sg_list = crawler.http_get(crawler.URL_SG_TOTO).text
+        sg_link = crawler.extract_singapore_toto_link(crawler.make_soup(sg_list))
+        sg_detail = crawler.http_get(sg_link).text if sg_link else None
+
+    cases = []
+    for name, html in pages.items():
+        if html:
+            cases.append((f"make_soup[{name}]", 1, lambda html=html: crawler.make_soup(html)))
+
+    if pages.get("4d4d"):
+        soup = crawler.make_soup(pages["4d4d"])
+        global_date, global_draw_no = crawler.extract_global_date(soup)
+        cases.append(("extract_global_date", 1, lambda: crawler.extract_global_date(soup)))
+        boxes = soup.find_all("div", class_="outerbox")
+        boxes_by_key = {}
+        for box in boxes:
+            key, _ = crawler.classify_outerbox(box)
+            if key:
+                boxes_by_key.setdefault(key, []).append(box)
+        cases.append(("classify_outerbox", len(boxes),
+                      lambda: [crawler.classify_outerbox(box) for box in boxes]))
+        for key, func in crawler.OUTERBOX_EXTRACTORS.items():
+            if key in boxes_by_key and func:
+                found = boxes_by_key[key]
+                cases.append((f"{func.__name__}[{key}]", len(found),
+                               lambda func=func, found=found: [func(box, global_date, global_draw_no) for box in found]))
+        cases.append(("extract_4d4d_page", 1, lambda: crawler.extract_4d4d_page(soup)))
+
+    if pages.get("4dlatest"):
+        latest = crawler.make_soup(pages["4dlatest"])
+        cases.append(("make_soup[4dlatest, tables only]", 1,
+                      lambda: crawler.make_soup(pages["4dlatest"], parse_only=crawler.SoupStrainer("table"))))
+        cases.append(("index_4dlatest_sections", 1, lambda: crawler.index_4dlatest_sections(latest)))
+        sections = crawler.index_4dlatest_sections(latest)
+        # 各板块函数只计算在自己表格里的提取，标题索引单独计时
+        for func in (crawler.extract_gd_lotto_from_4dlatest, crawler.extract_sabah_lotto_from_4dlatest,
+                     crawler.extract_magnum_jackpot_gold_from_4dlatest, crawler.extract_magnum_life_from_4dlatest,
+                     crawler.extract_sportstoto_from_4dlatest):
+            cases.append((func.__name__, 1, lambda func=func: func(latest, sections)))
+        cases.append(("extract_4dlatest_page", 1, lambda: crawler.extract_4dlatest_page(latest)))
+
+    if pages.get("4d2ulive"):
+        live = crawler.make_soup(pages["4d2ulive"])
+        cases.append(("extract_grand_dragon_from_4d2ulive", 1,
+                      lambda: crawler.extract_grand_dragon_from_4d2ulive(live)))
+
+    if sg_detail:
+        sg_list_soup = crawler.make_soup(sg_list)
+        sg_soup = crawler.make_soup(sg_detail)
+        cases.append(("extract_singapore_toto_link", 1, lambda: crawler.extract_singapore_toto_link(sg_list_soup)))
+        cases.append(("extract_singapore_toto", 1, lambda: crawler.extract_singapore_toto(sg_soup)))
+    return cases
+
+
+def cmd_run(args):
+    try:
+        crawler.use_fixtures(args.fixtures)
+    except FileNotFoundError as e:
+        print(f"❌ {e}，请先运行 python bench.py record")
+        return 1
+    crawler.HTML_PARSER = args.parser
+
+    results = {}
+    print(f"{'function':<48} {'calls':>5} {'median ms':>10} {'min ms':>9} {'peak KB':>9}")
+    cases = benchmark_cases()
+    cases.append(("main", 1, lambda: crawler.main(force=True)))
+    for name, calls, func in cases:
+        median_s, min_s, peak = measure(func, args.repeat, workdir=(name == "main"))
+        results[name] = {"calls": calls, "median_ms": round(median_s * 1000, 3),
+                         "min_ms": round(min_s * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+        print(f"{name:<48} {calls:>5} {median_s * 1000:>10.2f} {min_s * 1000:>9.2f} {peak / 1024:>9.0f}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\n与基线 {args.baseline} 对比（中位耗时）:")
+        for name, r in results.items():
+            if name in baseline and baseline[name]["median_ms"]:
+                ratio = r["median_ms"] / baseline[name]["median_ms"]
+                flag = "⚠️" if ratio > 1 + args.tolerance else "  "
+                print(f"  {flag} {name:<46} {baseline[name]['median_ms']:>9.2f} -> {r['median_ms']:>9.2f} ms  x{ratio:.2f}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"parser": args.parser, "repeat": args.repeat, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 已保存基准结果: {args.save}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬虫离线基准 / 解析后端对比")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="把线上页面录制为离线基准用的页面")
+    p.add_argument("--out", default=FIXTURES_DIR, help="录制目录")
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("run", help="用录制的页面对提取函数和 main() 计时")
+    p.add_argument("--fixtures", default=FIXTURES_DIR, help="录制目录")
+    p.add_argument("--parser", default=REFERENCE_BACKEND, choices=BACKENDS, help="HTML 解析后端")
+    p.add_argument("--repeat", type=int, default=20, help="每个函数重复次数，取中位数")
+    p.add_argument("--save", metavar="JSON", help="把结果保存为基线文件")
+    p.add_argument("--baseline", metavar="JSON", help="与之前保存的基线对比")
+    p.add_argument("--tolerance", type=float, default=0.2, help="慢于基线超过该比例时标记")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("parsers", help="对比各解析后端的提取结果与耗时")
+    for name in SOURCES:
+        p.add_argument(f"--{name}", dest="page_" + name, metavar="HTML", help=f"{name} 页面文件")
+    p.add_argument("--fixtures", metavar="DIR", help="使用录制目录中的页面，不访问网络")
+    p.add_argument("--offline", action="store_true", help="只使用给定的页面文件，不访问网络")
+    p.add_argument("--repeat", type=int, default=5, help="每个后端重复次数，取中位数")
+    p.set_defaults(func=cmd_parsers)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
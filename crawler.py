@@ -1,36 +1,688 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+import argparse
+import base64
+import contextlib
+import cProfile
+import gzip
+import hashlib
+import io
 import json
 import os
-from datetime import datetime
+import pstats
+from datetime import datetime, time as dtime, timedelta, timezone
+import random
 import re
+import struct
+import subprocess
+import threading
 import time
-from urllib.parse import urljoin
+import tracemalloc
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from functools import partial
+from urllib.parse import parse_qs, urljoin, urlsplit
 
 # ---------- 配置 ----------
 URL_4D4D = "https://4d4d.co/"
 URL_4DLATEST = "https://4dlatest.org/"
 URL_4D2ULIVE = "https://4d2ulive.com"  # 新增：4d2ulive 网站
+URL_SG_TOTO = "https://www.singaporepools.com.sg/en/product/Pages/toto_results.aspx"
+URL_SG_TOTO_DRAW = "https://www.singaporepools.com.sg/en/product/sr/Pages/toto_results.aspx?sppl={sppl}"  # 某期详情
+URL_DAMACAI_DATES = "https://www.damacai.com.my/ListPastResult"                      # 历史开奖日期列表
+URL_DAMACAI_PAST = "https://www.damacai.com.my/callpassresult?pastdate={date}"       # 某期结果的 JSON 链接
+
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("CRAWLER_CONNECT_TIMEOUT", 5))   # 建立连接的超时（秒）
+HTTP_READ_TIMEOUT = float(os.environ.get("CRAWLER_READ_TIMEOUT", 15))        # 等待响应数据的超时（秒）
+HTTP_RETRIES = 2                                # 连接失败、超时或 5xx / 429 时的最大重试次数
+HTTP_BACKOFF = 1.0                              # 第 n 次重试前随机等待 0 ~ HTTP_BACKOFF * 2**n 秒
+HTTP_RETRY_STATUS = {429, 500, 502, 503, 504}
+RUN_DEADLINE = float(os.environ.get("CRAWLER_RUN_DEADLINE", 60))  # 一轮运行中所有请求（含重试）的总时限（秒）
+CIRCUIT_THRESHOLD = 3       # 同一主机连续失败这么多次后熔断，之后的请求直接跳过
+CIRCUIT_COOLDOWN = 600      # 熔断后多久放行一次试探请求（秒），试探仍失败则加倍，最多 CIRCUIT_MAX_COOLDOWN
+CIRCUIT_MAX_COOLDOWN = 3600
+HTTP_MAX_PER_HOST = 2   # 每个主机同时进行的最大请求数
+FETCH_WORKERS = 4       # 并发抓取的数据源数量
+
+# 网站展示的全部公司（与 docs/index.html 的 COMPANY_LIST 保持一致），用于生成合并文件
+PUBLISHED_COMPANIES = [
+    'damacai', 'magnum', 'toto', 'singapore', 'damacai_1p3d',
+    'sandakan', 'sarawak_cashsweep', 'sabah', 'sabah_lotto',
+    'grand_dragon', 'singapore_toto', 'sportstoto_lotto',
+    'magnum_jackpot_gold', 'sportstoto_5d', 'sportstoto_6d',
+    'magnum_life', 'sportstoto_fireball'
+]
+BUNDLE_NAME = "bundle.json"   # 每个日期目录及 docs/data 下的合并文件名
+# 发布到 docs/data 的 JSON 默认压缩格式输出；调试时设 CRAWLER_JSON_DEBUG=1 改为缩进排版
+JSON_DEBUG = os.environ.get("CRAWLER_JSON_DEBUG") == "1"
+# 每个发布的 JSON 旁边额外写出的预压缩副本（.gz / .br，由 docs/data/.htaccess 按 Accept-Encoding 返回）；
+# 设为空串关闭。br 需要安装 brotli，未安装时只生成 .gz
+PUBLISH_ENCODINGS = [e for e in os.environ.get("CRAWLER_PRECOMPRESS", "gz,br").split(",") if e]
+
+# HTML 解析后端："html.parser"（纯 Python，无需依赖）、"lxml"（C 实现，最快）或 "html5lib"
+HTML_PARSER = os.environ.get("CRAWLER_PARSER", "html.parser")
+# 4dlatest.org 只构建 <table> 及其内容，其余标记解析时直接丢弃（html5lib 不支持，自动忽略）。
+# 要求各板块标题位于表格内；标题移到表格外时关掉即可
+FOURDLATEST_TABLES_ONLY = os.environ.get("CRAWLER_4DLATEST_TABLES_ONLY") == "1"
+
+DATA_DIR = "docs/data"  # 网站读取的结果目录
+DATES_SHARD_DIR = os.path.join(DATA_DIR, "dates")  # 按月分片的日期索引
+LOOKUP_DIR = os.path.join(DATA_DIR, "lookup")     # 号码反查索引：lookup/NN.json 及 lookup/ibox/NN.json
+LIVE_DIR = os.path.join(DATA_DIR, "live")         # 实时事件流：live/YYYY-MM-DD.jsonl，每行一个字段级变化
+LIVE_KEEP_DAYS = 7                                # 事件流文件保留天数
+STATE_DIR = "state"     # 跨运行持久化的状态（随 docs/data 一起提交）
+FETCH_STATE_PATH = os.path.join(STATE_DIR, "fetch_state.json")
+ARCHIVE_DIR = "archive" # 列式历史库，每年一个 draws-YYYY.bin 及其 index-YYYY.json
+SCHEDULE_STATE_PATH = os.path.join(STATE_DIR, "schedule.json")
+CIRCUIT_STATE_PATH = os.path.join(STATE_DIR, "circuit.json")          # 各主机的熔断状态，跨运行保留
+BACKFILL_CHECKPOINT_PATH = os.path.join(STATE_DIR, "backfill.json")   # 历史回填已完成的 {公司: [YYYYMMDD]}
+SG_TOTO_STATE_PATH = os.path.join(STATE_DIR, "singapore_toto.json")   # 列表页解析出的最新一期链接 {link, draw_no, resolved_at}
+SG_TOTO_LINK_TTL = 3600   # 缓存的最新一期链接多久内不再请求列表页（秒）
+SG_TOTO_LIST_CHECK = 86400   # 已有最新一期时至少隔这么久看一次列表页，发现日历外的特别开奖（秒）
+SOURCE_RESULTS_PATH = os.path.join(STATE_DIR, "source_results.json")  # 各数据源上次的提取结果及每家公司的采用来源
+SOURCE_STATS_PATH = os.path.join(STATE_DIR, "source_stats.json")      # 各数据源的健康与延迟（只在状况变化时改变，随 state 提交）
+METRICS_PATH = os.path.join(STATE_DIR, "metrics.json")                # 最近一轮的计时与计数指标（每次都变，不提交；CI 中作为构件上传）
+PROMETHEUS_PATH = os.environ.get("CRAWLER_PROMETHEUS")                # 额外写出 Prometheus 文本格式指标的路径
+PUBLISH_ROOT = "docs"   # 网站根目录，其下写入的文件都要发布到主机
+PUBLISH_MANIFEST_PATH = os.path.join(STATE_DIR, "publish.json")       # 尚未发布的 {路径: sha256 / 大小}，由 publish.py 上传
+QUARANTINE_DIR = os.path.join(STATE_DIR, "quarantine")                # 未通过校验的结果 <公司>.json（不覆盖 docs/data）
+
+# ---------- 数据源注册表 ----------
+# 每家公司按优先级排列的数据源。所有数据源并发抓取，优先采用完整的结果，其中开奖日期最新的胜出，
+# 日期相同或无法比较时按此顺序；首选数据源超时、失败或结果不完整时才退回后面的数据源
+COMPANY_SOURCES = {
+    'damacai': ["4d4d"], 'damacai_1p3d': ["4d4d"], 'magnum': ["4d4d"], 'toto': ["4d4d"],
+    'singapore': ["4d4d"], 'sabah': ["4d4d"], 'sandakan': ["4d4d"], 'sarawak_cashsweep': ["4d4d"],
+    'grand_dragon': ["4dlatest", "4d4d"],
+    'sportstoto_5d': ["4dlatest", "4d4d"], 'sportstoto_6d': ["4dlatest", "4d4d"],
+    'sportstoto_lotto': ["4dlatest", "4d4d"],
+    'magnum_jackpot_gold': ["4dlatest"], 'magnum_life': ["4dlatest"],
+    'sabah_lotto': ["4dlatest"],
+    'singapore_toto': ["singapore_toto"],
+}
+# 只能提供部分号码组的数据源 {数据源: {公司: (号码组, ...)}}：4dlatest 的 Sports Toto 区块只有 Star Toto。
+# 调度模式按已保存结果的来源只要求这些号码组填满，否则退回该数据源后当天永远等不到“完整”
+SOURCE_GAMES = {"4dlatest": {"sportstoto_lotto": ("star",)}}
+# 每个数据源提供哪些公司；调度模式只抓取仍有未完成公司的数据源
+SOURCE_COMPANIES = {}
+for _company, _sources in COMPANY_SOURCES.items():
+    for _source in _sources:
+        SOURCE_COMPANIES.setdefault(_source, []).append(_company)
+# 抓取阶段最多等待的秒数，超时的数据源本轮视为不可用，由后备数据源顶上；至少等满一次请求的
+# 连接 + 读取超时，慢但正常的镜像不会每轮都被放弃。放弃不记熔断失败（abandon_tasks），
+# 只记入数据源健康状态，选结果时排到健康的数据源之后
+FETCH_DEADLINE = HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT
+# 连续失败 / 超时达到这么多轮，或平均延迟超过 SOURCE_SLOW_MS 的数据源，选结果时排到健康的数据源之后
+SOURCE_DEGRADED_FAILURES = 3
+SOURCE_SLOW_MS = 5000
+SOURCE_LATENCY_STEP_MS = 500   # 延迟按此粒度保存，小幅波动不会改动已提交的状态文件
+
+# ---------- 开奖日历（调度模式使用）----------
+# 星期几开奖（0=周一 ... 6=周日），None 表示每天开奖；时间均为马来西亚 / 新加坡时间 (UTC+8)
+DRAW_TZ = timezone(timedelta(hours=8))
+WED_SAT_SUN = {2, 5, 6}
+DRAW_CALENDAR = {
+    'damacai': WED_SAT_SUN, 'damacai_1p3d': WED_SAT_SUN, 'magnum': WED_SAT_SUN, 'toto': WED_SAT_SUN,
+    'singapore': WED_SAT_SUN, 'sabah': WED_SAT_SUN, 'sabah_lotto': WED_SAT_SUN,
+    'sandakan': WED_SAT_SUN, 'sarawak_cashsweep': WED_SAT_SUN,
+    'sportstoto_5d': WED_SAT_SUN, 'sportstoto_6d': WED_SAT_SUN, 'sportstoto_lotto': WED_SAT_SUN,
+    'magnum_jackpot_gold': WED_SAT_SUN, 'magnum_life': WED_SAT_SUN,
+    'grand_dragon': None,
+    'singapore_toto': {0, 3},
+}
+# 周二等加开的特别开奖日 (YYYY-MM-DD)，当天按 WED_SAT_SUN 的公司开奖处理；也可用 CRAWLER_SPECIAL_DRAWS 环境变量逗号分隔追加
+SPECIAL_DRAW_DATES = set(filter(None, os.environ.get("CRAWLER_SPECIAL_DRAWS", "").split(",")))
+# 新加坡 TOTO 在周一、周四之外的 Cascade / 特别开奖日 (YYYY-MM-DD)，可用 CRAWLER_TOTO_SPECIAL_DRAWS 环境变量逗号分隔追加
+TOTO_SPECIAL_DRAW_DATES = set(filter(None, os.environ.get("CRAWLER_TOTO_SPECIAL_DRAWS", "").split(",")))
+LIVE_WINDOW = (dtime(18, 30), dtime(20, 0))   # 开奖直播时段，轮询间隔缩短
+POLL_INTERVAL = 300          # 直播时段外的轮询间隔（秒）
+LIVE_POLL_INTERVAL = 60      # 直播时段内的轮询间隔（秒）
+MAX_BACKOFF = 4              # 页面连续未变化时间隔最多放大到 4 倍
+DAEMON_POLL_INTERVAL = 15    # 常驻模式在直播时段内的轮询间隔（秒）
+
+# ---------- 历史回填 ----------
+BACKFILL_WORKERS = 8         # 同时抓取的开奖期数
+BACKFILL_RATE = 4.0          # 每个主机每秒最多发出的请求数
+BACKFILL_BATCH = 50          # 每回填这么多期就落盘一次（结果、索引与断点一起提交）
+
+# ---------- 运行指标 ----------
+# 计时器与计数器按 (名称, 标签) 累计，每轮 main() 开始时清零，结束时写入 METRICS_PATH
+_timers = {}     # (名称, 标签) -> [次数, 总秒数, 最长秒数]
+_counters = {}   # (名称, 标签) -> 累计值
+_metrics_lock = threading.Lock()
+_metrics_started = None
+
+def metric_key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, seconds, **labels):
+    with _metrics_lock:
+        entry = _timers.setdefault(metric_key(name, labels), [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+def count(name, value=1, **labels):
+    key = metric_key(name, labels)
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+@contextlib.contextmanager
+def metric_timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def timed_call(func, *args):
+    """调用提取函数并按函数名计时"""
+    with metric_timer("extract", extractor=func.__name__):
+        return func(*args)
+
+def reset_metrics():
+    global _metrics_started
+    with _metrics_lock:
+        _timers.clear()
+        _counters.clear()
+    _metrics_started = datetime.now(timezone.utc)
+
+def metrics_snapshot():
+    """{"timers": {名称: [{labels, count, seconds, max_seconds}]}, "counters": {名称: [{labels, value}]}}"""
+    with _metrics_lock:
+        timers, counters = dict(_timers), dict(_counters)
+    snapshot = {
+        "started": _metrics_started.isoformat(timespec="seconds") if _metrics_started else None,
+        "timers": {},
+        "counters": {},
+    }
+    for (name, labels), (n, total, longest) in sorted(timers.items()):
+        snapshot["timers"].setdefault(name, []).append(
+            {"labels": dict(labels), "count": n, "seconds": round(total, 6), "max_seconds": round(longest, 6)})
+    for (name, labels), value in sorted(counters.items()):
+        snapshot["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return snapshot
+
+def prometheus_text(snapshot):
+    """Prometheus 文本格式：计时器输出为 summary 的 _sum / _count 及 _max，计数器输出为 _total"""
+    def series(name, labels, value):
+        if not labels:
+            return f"{name} {value:g}"
+        pairs = ",".join(f'{k}="{escape(v)}"' for k, v in labels.items())
+        return f"{name}{{{pairs}}} {value:g}"
+
+    def escape(value):
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    lines = []
+    for name, entries in snapshot["timers"].items():
+        metric = f"crawler_{name}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for e in entries:
+            lines.append(series(f"{metric}_sum", e["labels"], e["seconds"]))
+            lines.append(series(f"{metric}_count", e["labels"], e["count"]))
+        lines.append(f"# TYPE {metric}_max gauge")
+        lines.extend(series(f"{metric}_max", e["labels"], e["max_seconds"]) for e in entries)
+    for name, entries in snapshot["counters"].items():
+        metric = f"crawler_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(series(metric, e["labels"], e["value"]) for e in entries)
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path=None, prometheus_path=None):
+    """指标直接落盘，不进入批量写入，也不计入 _written_paths（不会触发发布）"""
+    snapshot = metrics_snapshot()
+    atomic_write(path or METRICS_PATH, json.dumps(snapshot, ensure_ascii=False, indent=2).encode("utf-8"))
+    prometheus_path = prometheus_path or PROMETHEUS_PATH
+    if prometheus_path:
+        atomic_write(prometheus_path, prometheus_text(snapshot).encode("utf-8"))
+
+# ---------- HTTP 连接池 ----------
+class TimedConnectionMixin:
+    """记录新建连接的耗时：fetch_connect 为 DNS 解析 + TCP 连接，fetch_tls 为 TLS 握手"""
+    @property
+    def metric_host(self):
+        # 与 http_get 中 urlsplit(url).netloc 的写法一致，默认端口不带端口号
+        return self.host if self.port in (None, self.default_port) else f"{self.host}:{self.port}"
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        self._socket_seconds = time.perf_counter() - started
+        observe("fetch_connect", self._socket_seconds, host=self.metric_host)
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        self._socket_seconds = 0.0
+        super().connect()
+        if isinstance(self, HTTPSConnection):
+            observe("fetch_tls", time.perf_counter() - started - self._socket_seconds, host=self.metric_host)
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+_sessions = {}
+_host_limits = {}
+_pool_lock = threading.Lock()
+
+def get_session(url):
+    """返回该主机共享的 keep-alive Session 及其并发限制信号量"""
+    host = urlsplit(url).netloc
+    with _pool_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=HTTP_MAX_PER_HOST)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+            _host_limits[host] = threading.BoundedSemaphore(HTTP_MAX_PER_HOST)
+        return session, _host_limits[host]
+
+class CircuitOpenError(requests.ConnectionError):
+    """主机处于熔断状态，本次请求未发出"""
+
+_run_deadline = None   # 本轮运行所有请求的截止时间 (time.monotonic)，None 表示不限
+
+def start_run_deadline(seconds=None):
+    global _run_deadline
+    _run_deadline = time.monotonic() + (RUN_DEADLINE if seconds is None else seconds)
+
+def run_time_left():
+    return float("inf") if _run_deadline is None else _run_deadline - time.monotonic()
+
+_host_rate = None   # 每个主机每秒最多请求数，None 表示不限；历史回填时由 set_host_rate 设置
+_rate_next = {}     # 主机 -> 下一个请求最早可以发出的时间 (time.monotonic)
+
+def set_host_rate(rate):
+    global _host_rate
+    _host_rate = rate
+    _rate_next.clear()
+
+def throttle(host):
+    """按 _host_rate 给同一主机的请求排好发出时间，多个线程并发时也不会超过限速"""
+    if not _host_rate:
+        return
+    with _pool_lock:
+        now = time.monotonic()
+        slot = max(now, _rate_next.get(host, now))
+        _rate_next[host] = slot + 1 / _host_rate
+    if slot > now:
+        time.sleep(slot - now)
+
+def http_get(url, **kwargs):
+    """
+    所有网络请求的统一入口：复用主机连接池并遵守每主机并发上限；
+    连接失败、超时或 5xx / 429 时按带抖动的指数退避重试，重试不会超出本轮运行的总时限。
+    主机熔断期间直接抛出 CircuitOpenError，不再等待超时
+    """
+    if _fixtures is not None:
+        return fixture_response(url)
+    host = urlsplit(url).netloc
+    if task_abandoned():
+        raise requests.Timeout(f"抓取任务已超时放弃，不再请求 {url}")
+    if (task := current_task()) is not None:
+        task.host = host
+    try:
+        check_circuit(host)
+    except CircuitOpenError:
+        count("fetch_circuit_open", host=host)
+        raise
+    session, limit = get_session(url)
+    timeout = kwargs.pop("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    attempt = 0
+    while True:
+        remaining = run_time_left()
+        if remaining <= 0:
+            raise requests.Timeout(f"已超过本轮运行的总时限，放弃请求 {url}")
+        r = None
+        try:
+            throttle(host)
+            with limit:
+                started = time.perf_counter()
+                r = session.get(url, timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)),
+                                **kwargs)
+            # elapsed 截止到收到响应头（含新建连接），其余为读取正文的时间
+            ttfb = r.elapsed.total_seconds()
+            observe("fetch_ttfb", ttfb, host=host)
+            observe("fetch_body", max(time.perf_counter() - started - ttfb, 0.0), host=host)
+            count("fetch_bytes", len(r.content), host=host)
+            count("fetch_requests", host=host, status=r.status_code)
+            if r.status_code not in HTTP_RETRY_STATUS:
+                record_host_result(host, True)
+                return r
+            error = f"HTTP {r.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+            count("fetch_requests", host=host, status=type(e).__name__)
+        delay = random.uniform(0, HTTP_BACKOFF * 2 ** attempt)
+        if attempt >= HTTP_RETRIES or delay >= run_time_left():
+            break
+        attempt += 1
+        count("fetch_retries", host=host)
+        reason = error if isinstance(error, str) else type(error).__name__
+        print(f"  🔁 {url} 请求失败（{reason}），{delay:.1f}s 后第 {attempt} 次重试")
+        time.sleep(delay)
+    record_host_result(host, False)
+    if r is not None:
+        return r   # 重试用尽仍是 5xx / 429，交给调用方 raise_for_status
+    raise error
+
+# ---------- 主机熔断 ----------
+_circuit = None            # {主机: {"failures": 连续失败次数, "open_until": 熔断截止的 Unix 时间}}
+_circuit_lock = threading.Lock()
+
+def get_circuit_state():
+    global _circuit
+    if _circuit is None:
+        _circuit = load_state(CIRCUIT_STATE_PATH)
+    return _circuit
+
+def check_circuit(host):
+    """主机仍在熔断冷却期内时抛出 CircuitOpenError；冷却期过后放行请求作为试探"""
+    with _circuit_lock:
+        entry = get_circuit_state().get(host)
+    if entry and entry.get("open_until", 0) > time.time():
+        wait = entry["open_until"] - time.time()
+        raise CircuitOpenError(f"{host} 连续失败 {entry['failures']} 次，熔断中（约 {wait / 60:.0f} 分钟后重试）")
+
+def record_host_result(host, ok):
+    """
+    成功即清除该主机的失败记录；连续失败达到阈值后熔断，试探再失败时冷却时间加倍。
+    已超时放弃的抓取任务不再记录（它的超时已由 fetch_concurrently 计为一次失败）
+    """
+    with _task_lock, _circuit_lock:
+        if task_abandoned():
+            return
+        state = get_circuit_state()
+        if ok:
+            if state.pop(host, None):
+                print(f"  🔌 {host} 已恢复，解除熔断")
+            return
+        entry = state.setdefault(host, {"failures": 0})
+        entry["failures"] += 1
+        over = entry["failures"] - CIRCUIT_THRESHOLD
+        if over >= 0:
+            cooldown = min(CIRCUIT_COOLDOWN * 2 ** over, CIRCUIT_MAX_COOLDOWN)
+            entry["open_until"] = int(time.time() + cooldown)
+            print(f"  🔌 {host} 连续失败 {entry['failures']} 次，熔断 {cooldown // 60} 分钟")
+
+def commit_circuit_state():
+    """熔断状态只在主机失败或恢复时变化，平时不会产生新的提交"""
+    with _circuit_lock:
+        state = dict(get_circuit_state())
+    if state != load_state(CIRCUIT_STATE_PATH):
+        save_state(CIRCUIT_STATE_PATH, state)
+
+class FetchTask:
+    """fetch_concurrently 中的一个抓取任务：正在请求的主机，以及是否已因超时被放弃"""
+    __slots__ = ("host", "abandoned")
+
+    def __init__(self):
+        self.host, self.abandoned = None, False
+
+_task_local = threading.local()
+_task_lock = threading.RLock()   # 放弃任务与任务写入共享状态（熔断、抓取状态）互斥，放弃之后不会再有写入
+
+def current_task():
+    """当前线程正在执行的 FetchTask，不在并发抓取中时为 None"""
+    return getattr(_task_local, "task", None)
+
+def task_abandoned():
+    """当前线程的抓取任务已超时被放弃；写共享状态前须持有 _task_lock 再检查"""
+    task = current_task()
+    return task is not None and task.abandoned
+
+def run_task(task, func):
+    _task_local.task = task
+    try:
+        return func()
+    finally:
+        _task_local.task = None
+
+def abandon_tasks(tasks):
+    """
+    放弃超时仍未返回的任务：之后它们不再发出请求，也不再写入熔断状态和抓取状态（页面并未提取，
+    记下摘要会让下一轮误判为未变化）。主机不记熔断失败：请求本身没有出错，只是本轮没等到
+    """
+    with _task_lock:
+        for task in tasks:
+            task.abandoned = True
+        for host in dict.fromkeys(t.host for t in tasks if t.host):
+            count("fetch_deadline_exceeded", host=host)
+
+def fetch_concurrently(tasks, timeout=None):
+    """
+    并发执行互不依赖的抓取任务 {名称: 函数}，返回 {名称: 结果}，失败的任务结果为 None；
+    超过 timeout 秒仍未完成的任务不再等待，不出现在返回结果中（见 abandon_tasks）
+    """
+    results = {}
+    if FETCH_WORKERS <= 1:
+        # 串行执行（--profile 使用），所有抓取与解析都在调用线程里，便于 cProfile 统计
+        for name, func in tasks.items():
+            try:
+                results[name] = func()
+            except Exception as e:
+                print(f"❌ 数据源 {name} 抓取异常: {e}")
+                results[name] = None
+        return results
+    pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+    running = {name: FetchTask() for name in tasks}
+    futures = {pool.submit(run_task, running[name], func): name for name, func in tasks.items()}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"❌ 数据源 {name} 抓取异常: {e}")
+                results[name] = None
+    except FuturesTimeout:
+        late = [name for name in tasks if name not in results]
+        print(f"⌛ 数据源 {', '.join(late)} 超过 {timeout}s 未返回，本轮不再等待")
+        abandon_tasks([running[name] for name in late])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+# ---------- 离线回放 ----------
+FIXTURE_INDEX = "index.json"   # 录制目录中的 {url: 文件名}
+_fixtures = None               # 回放模式下 {url: 页面文件路径}，None 表示正常联网
+
+def use_fixtures(directory):
+    """之后的 http_get 改为读取 directory 下录制好的页面，不再访问网络"""
+    global _fixtures
+    index = load_state(os.path.join(directory, FIXTURE_INDEX))
+    if not index:
+        raise FileNotFoundError(f"{directory} 中没有录制的页面（缺少 {FIXTURE_INDEX}）")
+    # 绝对路径：bench.py 在临时目录中运行 main() 时仍能读到
+    _fixtures = {url: os.path.join(os.path.abspath(directory), name) for url, name in index.items()}
+
+def fixture_response(url):
+    path = _fixtures.get(url)
+    if not path:
+        raise requests.ConnectionError(f"没有录制的页面: {url}")
+    r = requests.Response()
+    with open(path, "rb") as f:
+        r._content = f.read()
+    r.status_code = 200
+    r.url = url
+    r.encoding = "utf-8"
+    return r
+
+# ---------- 持久化状态 ----------
+def load_state(path):
+    content = read_file(path)
+    if content is None:
+        return {}
+    try:
+        return json.loads(content)
+    except ValueError:
+        return {}
+
+def save_state(path, data):
+    write_if_changed(path, json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True))
+
+# ---------- 条件请求（ETag / Last-Modified / 内容摘要）----------
+_fetch_state = None
+_fetch_state_updates = {}
+
+def get_fetch_state():
+    global _fetch_state
+    if _fetch_state is None:
+        _fetch_state = load_state(FETCH_STATE_PATH)
+    return _fetch_state
+
+def fetch_html_if_changed(url, force=False):
+    """
+    带 If-None-Match / If-Modified-Since 的抓取，返回 (html, unchanged)
+    页面返回 304 或正文摘要与上次相同时返回 (None, True)，抓取失败返回 (None, False)
+    """
+    entry = {} if force else get_fetch_state().get(url, {})
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        print(f"🌐 正在请求: {url}")
+        r = http_get(url, headers=headers)
+        print(f"  状态码: {r.status_code}")
+        if r.status_code == 304:
+            print(f"  ♻️ {url} 未变化 (304)，跳过解析")
+            return None, True
+        r.raise_for_status()
+    except requests.RequestException as e:
+        print(f"❌ 抓取失败 {url}: {e}")
+        return None, False
+    digest = hashlib.sha256(r.content).hexdigest()
+    with _task_lock:
+        if task_abandoned():
+            print(f"  ⌛ {url} 返回时抓取任务已超时放弃，不记录抓取状态")
+            return None, False
+        _fetch_state_updates[url] = {
+            "etag": r.headers.get("ETag", ""),
+            "last_modified": r.headers.get("Last-Modified", ""),
+            "digest": digest,
+        }
+    if entry.get("digest") == digest:
+        print(f"  ♻️ {url} 内容摘要未变化，跳过解析")
+        return None, True
+    r.encoding = "utf-8"
+    return r.text, False
+
+def commit_fetch_state():
+    """页面处理完成后才写入抓取状态，避免中途失败导致下次误判为未变化"""
+    state = get_fetch_state()
+    for url, entry in _fetch_state_updates.items():
+        state[url] = entry
+    _fetch_state_updates.clear()
+    if state != load_state(FETCH_STATE_PATH):
+        save_state(FETCH_STATE_PATH, state)
 
 # ---------- 辅助函数 ----------
 def fetch_html(url):
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
     try:
         print(f"🌐 正在请求: {url}")
-        r = requests.get(url, headers=headers, timeout=15)
+        r = http_get(url)
         print(f"  状态码: {r.status_code}")
         r.encoding = "utf-8"
         r.raise_for_status()
         return r.text
-    except Exception as e:
+    except requests.RequestException as e:
         print(f"❌ 抓取失败 {url}: {e}")
         return None
 
+# ---------- 预编译正则 ----------
+ARCHIVE_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+DMY_DATE_RE = re.compile(r"(\d{2}-\d{2}-\d{4})")
+DRAW_NO_LABEL_RE = re.compile(r"Draw No:?")
+SPECIAL_RE = re.compile("Special|特別獎")
+CONSOLATION_RE = re.compile("Consolation|安慰獎")
+LABEL_3D_RE = re.compile("3D")
+LABEL_5D_RE = re.compile(r"5D", re.IGNORECASE)
+LABEL_6D_RE = re.compile(r"6D", re.IGNORECASE)
+PRIZE_LABEL_RE = re.compile(r'^(2nd|3rd|4th|5th)', re.IGNORECASE)
+OR_SPLIT_RE = re.compile(r'\s+or\s+', re.IGNORECASE)
+STAR_TOTO_RE = re.compile("Star Toto 6/50")
+POWER_TOTO_RE = re.compile("Power Toto 6/55")
+SUPREME_TOTO_RE = re.compile("Supreme Toto 6/58")
+SLASH_DATE_RE = re.compile(r"(\d{2}/\d{2}/\d{4})")
+SLASH_DRAW_NO_RE = re.compile(r"(\d+/\d+)")
+TOTO_DRAW_NO_RE = re.compile(r"Draw No:?\s*(\d+-\d+)", re.IGNORECASE)
+AMOUNT_RE = re.compile(r'([\d,]+(?:.\d+)?)')
+RM_AMOUNT_RE = re.compile(r'RM\s([\d,]+(?:.\d+)?)')
+GROUP_RE = re.compile(r"GROUP\s+(\d+)", re.IGNORECASE)
+TOTO_5D_RE = re.compile("5D")
+TOTO_6D_RE = re.compile("6D")
+# 4dlatest.org 各板块标题，index_4dlatest_sections 一次遍历建立 板块 -> [标题文本节点]
+FOURDLATEST_SECTIONS = {
+    "grand_dragon": re.compile(r"GDLOTTO.*豪龙", re.IGNORECASE),
+    "sabah_lotto": re.compile(r"SABAH88.*LOTTO", re.IGNORECASE),
+    "magnum_jackpot_gold": re.compile(r"MAGNUM.*JACKPOT.*GOLD", re.IGNORECASE),
+    "magnum_life": re.compile(r"MAGNUM.*LIFE", re.IGNORECASE),
+    "sportstoto": re.compile(r"Sports\s*Toto", re.IGNORECASE),
+}
+
+_parser_fallback_warned = set()
+
+def make_soup(html, parser=None, parse_only=None):
+    """按配置的后端构建解析树，后端未安装时回退到内置 html.parser；parse_only 为 SoupStrainer 时只构建匹配的部分"""
+    parser = parser or HTML_PARSER
+    if parser == "html5lib":
+        parse_only = None
+    try:
+        with metric_timer("parse", parser=parser):
+            return BeautifulSoup(html, parser, parse_only=parse_only)
+    except FeatureNotFound:
+        if parser not in _parser_fallback_warned:
+            print(f"⚠️ 解析后端 {parser} 未安装，回退到 html.parser")
+            _parser_fallback_warned.add(parser)
+        with metric_timer("parse", parser="html.parser"):
+            return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
 def find_parent_table(element):
     while element and element.name != 'table':
         element = element.parent
     return element
 
+def index_4dlatest_sections(soup):
+    """
+    只遍历一次全部文本节点，返回 {板块: [标题文本节点]}（按文档顺序）。
+    各 *_from_4dlatest 函数从这里取标题，再只在标题所在的表格里查找，不再各自搜索整个页面
+    """
+    sections = {key: [] for key in FOURDLATEST_SECTIONS}
+    for node in soup.find_all(string=True):
+        for key, pattern in FOURDLATEST_SECTIONS.items():
+            if pattern.search(node):
+                sections[key].append(node)
+    return sections
+
+def section_table(header):
+    """标题所在的表格，标题不在表格内时取其后的第一个表格"""
+    return header.find_parent("table") or header.find_next("table")
+
 def parse_4dmoon_date(date_str):
     """将 02-Mar-2026 转换为 02-03-2026"""
     try:
@@ -48,49 +700,305 @@ def extract_global_date(soup):
     if not draw_row:
         return None, None
     date_text = draw_row.get_text(strip=True)
-    match = re.search(r"(\d{2}-\d{2}-\d{4})", date_text)
+    match = DMY_DATE_RE.search(date_text)
     date = match.group(1) if match else None
     next_td = draw_row.find_next("td", class_="resultdrawdate")
     draw_no = None
     if next_td:
         no_text = next_td.get_text(strip=True)
-        draw_no = re.sub(r"Draw No:?", "", no_text).strip()
+        draw_no = DRAW_NO_LABEL_RE.sub("", no_text).strip()
     return date, draw_no
 
+# ---------- 结果模型 ----------
+# 提取函数返回下面的结果类型，校验、挑选来源、判断是否完整都直接用结果对象，
+# 只在保存（save_json）和写数据源缓存时 to_dict() 一次，生成与原来完全相同的 JSON 结构。
+# 号码压成一个小整数：数值 << 4 | 位数（保留前导零，"0501" -> 501 << 4 | 4）；
+# 空串为 None，"----" / "*123" 之类的占位符等非数字文本原样保留为 str
+PRIZE_NAMES = ("1st", "2nd", "3rd", "4th", "5th", "6th")
+FOUR_D_KEYS = ("draw_date", "draw_no", "1st", "2nd", "3rd", "special", "consolation")
+# 乐透类公司的号码组及结果完整时每组至少的个数；LOTTO_ROWS 为还需要的表格行数
+LOTTO_GAMES = {
+    "sportstoto_lotto": {"star": 7, "power": 6, "supreme": 6},
+    "sabah_lotto": {"winning_numbers": 7},
+    "magnum_life": {"winning_numbers": 8, "bonus_numbers": 2},
+    "singapore_toto": {"winning_numbers": 7},
+}
+LOTTO_ROWS = {"singapore_toto": {"prize_table": 6}}
+# 乐透各号码组的最大球号（均从 1 开始，同组内不重复）
+LOTTO_BALLS = {
+    "sportstoto_lotto": {"star": 50, "power": 55, "supreme": 58},
+    "sabah_lotto": {"winning_numbers": 45},
+    "magnum_life": {"winning_numbers": 36, "bonus_numbers": 36},
+    "singapore_toto": {"winning_numbers": 49},
+}
+# 各奖项号码的位数：5D 的 4th ~ 6th 为头奖的后 4 / 3 / 2 位，6D 的 2nd ~ 5th 为头奖的前后 5 / 4 / 3 / 2 位
+FOUR_D_WIDTH = 4
+THREE_D_WIDTH = 3
+FIVE_D_WIDTHS = (5, 5, 5, 4, 3, 2)
+SIX_D_WIDTHS = (6, 5, 4, 3, 2)
+PRIZE_LIST_SIZE = 10   # 4D 特别奖 / 安慰奖的个数
+# 按公司覆盖 4D 类号码的格式（空格分隔的各段位数）：Da Ma Cai 1+3D 每个号码是两组 3 位数，如 "926 064"
+FOUR_D_GROUPS = {"damacai_1p3d": (THREE_D_WIDTH, THREE_D_WIDTH)}
+NOT_DRAWN = "-"        # 乐透号码组整组为 "-" 表示该玩法当天不开奖（如周六的 Supreme Toto）
+
+def pack_number(text):
+    if not text:
+        return None
+    if text.isascii() and text.isdigit() and len(text) < 16:
+        return int(text) << 4 | len(text)
+    return text
+
+def unpack_number(value):
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        return str(value >> 4).zfill(value & 15)
+    return value
+
+def pack_numbers(texts):
+    return [pack_number(t) for t in texts]
+
+def unpack_numbers(values):
+    return [unpack_number(v) for v in values]
+
+def is_placeholder(value):
+    return isinstance(value, str) and (value.strip() == "----" or "*" in value)
+
+def has_placeholder(value):
+    """结果中是否还有 "----" / "*" 之类的占位符（开奖进行中）"""
+    if isinstance(value, str):
+        return is_placeholder(value)
+    if isinstance(value, dict):
+        return any(has_placeholder(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_placeholder(v) for v in value)
+    return False
+
+def numbers_filled(values, count):
+    """至少 count 个号码位有值，且没有占位符"""
+    return sum(v is not None for v in values) >= count and not any(map(is_placeholder, values))
+
+def game_drawn(numbers):
+    """乐透号码组是否开奖：整组都是 NOT_DRAWN 时不开奖，既不要求填满也不校验"""
+    return not numbers or any(n != NOT_DRAWN for n in numbers)
+
+def header_filled(result):
+    return not is_placeholder(result.draw_date) and not is_placeholder(result.draw_no)
+
+@dataclass(slots=True)
+class FourDResult:
+    """4D：头三奖 + 特别奖 + 安慰奖；tail 为依次附加在后面的字段（type、3d、jackpot 等）"""
+    draw_date: str = ""
+    draw_no: str = ""
+    first: object = None
+    second: object = None
+    third: object = None
+    special: list = field(default_factory=list)
+    consolation: list = field(default_factory=list)
+    tail: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        data = {"draw_date": self.draw_date, "draw_no": self.draw_no,
+                "1st": unpack_number(self.first), "2nd": unpack_number(self.second),
+                "3rd": unpack_number(self.third),
+                "special": unpack_numbers(self.special), "consolation": unpack_numbers(self.consolation)}
+        data.update(self.tail)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("draw_date", ""), data.get("draw_no", ""),
+                   pack_number(data.get("1st")), pack_number(data.get("2nd")), pack_number(data.get("3rd")),
+                   pack_numbers(data.get("special") or []), pack_numbers(data.get("consolation") or []),
+                   {k: v for k, v in data.items() if k not in FOUR_D_KEYS})
+
+    @property
+    def has_numbers(self):
+        return self.first is not None or bool(self.special) or bool(self.consolation)
+
+    @property
+    def complete(self):
+        return (header_filled(self) and numbers_filled((self.first, self.second, self.third), 3)
+                and numbers_filled(self.special, 10) and numbers_filled(self.consolation, 10)
+                and not has_placeholder(self.tail))
+
+@dataclass(slots=True)
+class FiveDResult:
+    """Sports Toto 5D：1st ~ 6th 各一个号码"""
+    draw_date: str = ""
+    draw_no: str = ""
+    prizes: list = field(default_factory=lambda: [None] * 6)
+
+    def to_dict(self):
+        data = {"draw_date": self.draw_date, "draw_no": self.draw_no, "type": "5d"}
+        data.update(zip(PRIZE_NAMES, unpack_numbers(self.prizes)))
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("draw_date", ""), data.get("draw_no", ""),
+                   [pack_number(data.get(name)) for name in PRIZE_NAMES])
+
+    @property
+    def has_numbers(self):
+        return any(p is not None for p in self.prizes)
+
+    @property
+    def complete(self):
+        return header_filled(self) and numbers_filled(self.prizes, 6)
+
+@dataclass(slots=True)
+class SixDResult:
+    """Sports Toto 6D：1st 一个号码，2nd ~ 5th 各有 main / alt 两个号码"""
+    draw_date: str = ""
+    draw_no: str = ""
+    first: object = None
+    pairs: list = field(default_factory=lambda: [[None, None] for _ in range(4)])
+
+    def to_dict(self):
+        data = {"draw_date": self.draw_date, "draw_no": self.draw_no, "type": "6d",
+                "1st": unpack_number(self.first)}
+        for name, (main, alt) in zip(PRIZE_NAMES[1:], self.pairs):
+            data[name] = {"main": unpack_number(main), "alt": unpack_number(alt)}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        pairs = []
+        for name in PRIZE_NAMES[1:5]:
+            pair = data.get(name) if isinstance(data.get(name), dict) else {}
+            pairs.append([pack_number(pair.get("main")), pack_number(pair.get("alt"))])
+        return cls(data.get("draw_date", ""), data.get("draw_no", ""), pack_number(data.get("1st")), pairs)
+
+    @property
+    def has_numbers(self):
+        return self.first is not None or any(main is not None for main, _ in self.pairs)
+
+    @property
+    def complete(self):
+        numbers = [self.first] + [n for pair in self.pairs for n in pair]
+        return header_filled(self) and numbers_filled(numbers, 1 + 2 * len(PRIZE_NAMES[1:5]))
+
+@dataclass(slots=True)
+class LottoResult:
+    """
+    乐透类结果：games 为 {号码组: [号码]}，按 LOTTO_GAMES[company] 判断是否完整（当天不开奖的号码组除外）。
+    输出顺序为 draw_date、draw_no、head、type（kind 为 None 时不输出）、games、tail
+    """
+    company: str
+    draw_date: str = ""
+    draw_no: str = ""
+    kind: str = None
+    games: dict = field(default_factory=dict)
+    head: dict = field(default_factory=dict)
+    tail: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        data = {"draw_date": self.draw_date, "draw_no": self.draw_no}
+        data.update(self.head)
+        if self.kind is not None:
+            data["type"] = self.kind
+        for name, numbers in self.games.items():
+            data[name] = unpack_numbers(numbers)
+        data.update(self.tail)
+        return data
+
+    @classmethod
+    def from_dict(cls, company, data):
+        result = cls(company, data.get("draw_date", ""), data.get("draw_no", ""))
+        games = LOTTO_GAMES[company]
+        for key, value in data.items():
+            if key in ("draw_date", "draw_no"):
+                continue
+            if key == "type":
+                result.kind = value
+            elif key in games:
+                result.games[key] = pack_numbers(value or [])
+            else:
+                (result.tail if result.games else result.head)[key] = value
+        return result
+
+    @property
+    def has_numbers(self):
+        return any(self.games.values())
+
+    @property
+    def complete(self):
+        return self.complete_for(LOTTO_GAMES[self.company])
+
+    def complete_for(self, games):
+        """games 为要求填满的 {号码组: 至少个数}，数据源只提供部分号码组时传入其子集"""
+        return (header_filled(self) and all(numbers_filled(self.games.get(name, ()), count)
+                    for name, count in games.items() if game_drawn(self.games.get(name)))
+                and all(len(self.tail.get(name) or ()) >= count
+                        for name, count in LOTTO_ROWS.get(self.company, {}).items())
+                and not has_placeholder(self.head) and not has_placeholder(self.tail))
+
+@dataclass(slots=True)
+class JackpotGoldResult:
+    """Magnum Jackpot Gold：若干组号码（组内的 "+" 原样保留）及奖池金额"""
+    draw_date: str = ""
+    draw_no: str = ""
+    groups: list = field(default_factory=list)     # [(组号, [号码])]
+    jackpots: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {"draw_date": self.draw_date, "draw_no": self.draw_no,
+                "groups": [{"group": group, "numbers": unpack_numbers(numbers)} for group, numbers in self.groups],
+                "jackpots": self.jackpots}
+
+    @classmethod
+    def from_dict(cls, data):
+        groups = [(g.get("group"), pack_numbers(g.get("numbers") or [])) for g in data.get("groups") or []]
+        return cls(data.get("draw_date", ""), data.get("draw_no", ""), groups, list(data.get("jackpots") or []))
+
+    @property
+    def has_numbers(self):
+        return bool(self.groups) or bool(self.jackpots)
+
+    @property
+    def complete(self):
+        return (header_filled(self) and bool(self.groups) and not has_placeholder(self.jackpots)
+                and not has_placeholder([n for _, numbers in self.groups for n in numbers]))
+
+RESULT_TYPES = {'sportstoto_5d': FiveDResult, 'sportstoto_6d': SixDResult, 'magnum_jackpot_gold': JackpotGoldResult}
+
+RESULT_CLASSES = {cls.__name__: cls for cls in (FourDResult, FiveDResult, SixDResult, LottoResult, JackpotGoldResult)}
+
+def result_type(company):
+    """公司声明的结果类型"""
+    return LottoResult if company in LOTTO_GAMES else RESULT_TYPES.get(company, FourDResult)
+
+def result_from_dict(company, data, kind=None):
+    """把保存的 JSON 结果还原成对应的结果类型；kind 为保存时记录的类名，缺省按公司推断"""
+    cls = RESULT_CLASSES.get(kind) or result_type(company)
+    if cls is LottoResult:
+        return LottoResult.from_dict(company, data)
+    return cls.from_dict(data)
+
 # ---------- 4d4d.co 基础提取 ----------
 def base_extract(box, global_date, global_draw_no):
-    data = {
-        "draw_date": "",
-        "draw_no": "",
-        "1st": "",
-        "2nd": "",
-        "3rd": "",
-        "special": [],
-        "consolation": [],
-        "type": None
-    }
+    data = FourDResult(tail={"type": None})
     draw_row = box.find("td", class_="resultdrawdate")
     if draw_row:
         date_text = draw_row.get_text(strip=True)
-        match = re.search(r"(\d{2}-\d{2}-\d{4})", date_text)
+        match = DMY_DATE_RE.search(date_text)
         if match:
-            data["draw_date"] = match.group(1)
+            data.draw_date = match.group(1)
         next_td = draw_row.find_next("td", class_="resultdrawdate")
         if next_td:
             no_text = next_td.get_text(strip=True)
-            data["draw_no"] = re.sub(r"Draw No:?", "", no_text).strip()
-    if not data["draw_date"] and global_date:
-        data["draw_date"] = global_date
-    if not data["draw_no"] and global_draw_no:
-        data["draw_no"] = global_draw_no
+            data.draw_no = DRAW_NO_LABEL_RE.sub("", no_text).strip()
+    if not data.draw_date and global_date:
+        data.draw_date = global_date
+    if not data.draw_no and global_draw_no:
+        data.draw_no = global_draw_no
 
     prize_tds = box.find_all("td", class_="resulttop")
     if len(prize_tds) >= 3:
-        data["1st"] = prize_tds[0].get_text(strip=True)
-        data["2nd"] = prize_tds[1].get_text(strip=True)
-        data["3rd"] = prize_tds[2].get_text(strip=True)
+        data.first, data.second, data.third = (pack_number(td.get_text(strip=True)) for td in prize_tds[:3])
 
-    special_section = box.find("td", string=re.compile("Special|特別獎"))
+    special_section = box.find("td", string=SPECIAL_RE)
     if special_section:
         table = special_section.find_parent("table")
         if table:
@@ -102,9 +1010,9 @@ def base_extract(box, global_date, global_draw_no):
                     num = td.get_text(strip=True)
                     if num and num != "----":
                         special_numbers.append(num)
-            data["special"] = special_numbers
+            data.special = pack_numbers(special_numbers)
 
-    cons_section = box.find("td", string=re.compile("Consolation|安慰獎"))
+    cons_section = box.find("td", string=CONSOLATION_RE)
     if cons_section:
         table = cons_section.find_parent("table")
         if table:
@@ -116,7 +1024,7 @@ def base_extract(box, global_date, global_draw_no):
                     num = td.get_text(strip=True)
                     if num and num != "----":
                         cons_numbers.append(num)
-            data["consolation"] = cons_numbers
+            data.consolation = pack_numbers(cons_numbers)
     return data
 
 def extract_damacai(box, global_date, global_draw_no):
@@ -129,24 +1037,13 @@ def extract_toto(box, global_date, global_draw_no):
     return base_extract(box, global_date, global_draw_no)
 
 def extract_singapore(box, global_date, global_draw_no):
-    data = {
-        "draw_date": global_date,
-        "draw_no": global_draw_no,
-        "1st": "",
-        "2nd": "",
-        "3rd": "",
-        "special": [],
-        "consolation": [],
-        "type": None
-    }
+    data = FourDResult(global_date, global_draw_no, tail={"type": None})
     prize_tds = box.find_all("td", class_="resulttop")
     if len(prize_tds) >= 3:
-        data["1st"] = prize_tds[0].get_text(strip=True)
-        data["2nd"] = prize_tds[1].get_text(strip=True)
-        data["3rd"] = prize_tds[2].get_text(strip=True)
+        data.first, data.second, data.third = (pack_number(td.get_text(strip=True)) for td in prize_tds[:3])
 
     def extract_numbers_from_section(title_pattern):
-        section = box.find("td", string=re.compile(title_pattern))
+        section = box.find("td", string=title_pattern)
         if not section:
             return []
         table = section.find_parent("table")
@@ -162,8 +1059,8 @@ def extract_singapore(box, global_date, global_draw_no):
                     numbers.append(text)
         return numbers
 
-    data["special"] = extract_numbers_from_section("Special|特別獎")
-    data["consolation"] = extract_numbers_from_section("Consolation|安慰獎")
+    data.special = pack_numbers(extract_numbers_from_section(SPECIAL_RE))
+    data.consolation = pack_numbers(extract_numbers_from_section(CONSOLATION_RE))
     return data
 
 def extract_damacai_1p3d(box, global_date, global_draw_no):
@@ -177,14 +1074,14 @@ def extract_cashsweep(box, global_date, global_draw_no):
 
 def extract_sabah(box, global_date, global_draw_no):
     data = base_extract(box, global_date, global_draw_no)
-    data['3d'] = extract_3d(box)
+    data.tail['3d'] = extract_3d(box)
     return data
 
 def extract_grand_dragon(box, global_date, global_draw_no):
     return base_extract(box, global_date, global_draw_no)
 
 def extract_3d(box):
-    h3 = box.find("td", string=re.compile("3D"))
+    h3 = box.find("td", string=LABEL_3D_RE)
     if not h3:
         return {}
     table = h3.find_parent("table")
@@ -204,18 +1101,8 @@ def extract_sportstoto_5d(box, global_date, global_draw_no):
     """
     从 outerbox 中提取 Sports Toto 5D 开奖号码（支持缩略形式，如 4th: 9254）
     """
-    data = {
-        "draw_date": global_date,
-        "draw_no": global_draw_no,
-        "type": "5d",
-        "1st": "",
-        "2nd": "",
-        "3rd": "",
-        "4th": "",
-        "5th": "",
-        "6th": ""
-    }
-    header = box.find("td", string=re.compile(r"5D", re.IGNORECASE))
+    data = FiveDResult(global_date, global_draw_no)
+    header = box.find("td", string=LABEL_5D_RE)
     if not header:
         return data
     table = header.find_parent("table")
@@ -228,18 +1115,10 @@ def extract_sportstoto_5d(box, global_date, global_draw_no):
             continue
         label = tds[0].get_text(strip=True).lower()
         number = tds[1].get_text(strip=True) if len(tds) > 1 else ""
-        if "1st" in label:
-            data["1st"] = number
-        elif "2nd" in label:
-            data["2nd"] = number
-        elif "3rd" in label:
-            data["3rd"] = number
-        elif "4th" in label:
-            data["4th"] = number
-        elif "5th" in label:
-            data["5th"] = number
-        elif "6th" in label:
-            data["6th"] = number
+        for i, name in enumerate(PRIZE_NAMES):
+            if name in label:
+                data.prizes[i] = pack_number(number)
+                break
     return data
 
 # ---------- 重写的 Sports Toto 6D 提取函数 ----------
@@ -249,8 +1128,8 @@ def extract_6d_pair(row_text):
     返回 (main, alt)
     """
     # 移除奖项标签
-    row_text = re.sub(r'^(2nd|3rd|4th|5th)', '', row_text, flags=re.IGNORECASE).strip()
-    parts = re.split(r'\s+or\s+', row_text, flags=re.IGNORECASE)
+    row_text = PRIZE_LABEL_RE.sub('', row_text).strip()
+    parts = OR_SPLIT_RE.split(row_text)
     if len(parts) >= 2:
         main = parts[0].strip()
         alt = parts[1].strip()
@@ -259,21 +1138,23 @@ def extract_6d_pair(row_text):
         alt = ""
     return main, alt
 
+def set_6d_prize(data, label, row_text, tds):
+    """按奖项标签把一行写进 SixDResult：1st 取第二格，2nd ~ 5th 取 main / alt"""
+    if "1st" in label:
+        if len(tds) >= 2:
+            data.first = pack_number(tds[1].get_text(strip=True))
+        return
+    for i, name in enumerate(PRIZE_NAMES[1:5]):
+        if name in label:
+            data.pairs[i] = pack_numbers(extract_6d_pair(row_text))
+            return
+
 def extract_sportstoto_6d(box, global_date, global_draw_no):
     """
     从 outerbox 中提取 Sports Toto 6D 开奖号码（支持 or 选项和 * 占位符）
     """
-    data = {
-        "draw_date": global_date,
-        "draw_no": global_draw_no,
-        "type": "6d",
-        "1st": "",
-        "2nd": {"main": "", "alt": ""},
-        "3rd": {"main": "", "alt": ""},
-        "4th": {"main": "", "alt": ""},
-        "5th": {"main": "", "alt": ""}
-    }
-    header = box.find("td", string=re.compile(r"6D", re.IGNORECASE))
+    data = SixDResult(global_date, global_draw_no)
+    header = box.find("td", string=LABEL_6D_RE)
     if not header:
         return data
     table = header.find_parent("table")
@@ -286,25 +1167,7 @@ def extract_sportstoto_6d(box, global_date, global_draw_no):
         if len(tds) < 2:
             continue
         label = tds[0].get_text(strip=True).lower()
-        if "1st" in label:
-            if len(tds) >= 2:
-                data["1st"] = tds[1].get_text(strip=True)
-        elif "2nd" in label:
-            main, alt = extract_6d_pair(row_text)
-            data["2nd"]["main"] = main
-            data["2nd"]["alt"] = alt
-        elif "3rd" in label:
-            main, alt = extract_6d_pair(row_text)
-            data["3rd"]["main"] = main
-            data["3rd"]["alt"] = alt
-        elif "4th" in label:
-            main, alt = extract_6d_pair(row_text)
-            data["4th"]["main"] = main
-            data["4th"]["alt"] = alt
-        elif "5th" in label:
-            main, alt = extract_6d_pair(row_text)
-            data["5th"]["main"] = main
-            data["5th"]["alt"] = alt
+        set_6d_prize(data, label, row_text, tds)
     return data
 
 # ---------- Sports Toto Lotto 提取（原有，稍作优化）----------
@@ -313,7 +1176,7 @@ def extract_lotto(box):
     power = []
     supreme = []
     jackpots = []
-    star_section = box.find("td", string=re.compile("Star Toto 6/50"))
+    star_section = box.find("td", string=STAR_TOTO_RE)
     if star_section:
         table = star_section.find_parent("table")
         if table:
@@ -326,7 +1189,7 @@ def extract_lotto(box):
                 jp_tds = row.find_all("td", class_="resultbottomtotojpval")
                 if jp_tds:
                     jackpots.append(jp_tds[0].get_text(strip=True))
-    power_section = box.find("td", string=re.compile("Power Toto 6/55"))
+    power_section = box.find("td", string=POWER_TOTO_RE)
     if power_section:
         table = power_section.find_parent("table")
         if table:
@@ -344,7 +1207,7 @@ def extract_lotto(box):
                             jackpots.append(text)
                             break
                     break
-    supreme_section = box.find("td", string=re.compile("Supreme Toto 6/58"))
+    supreme_section = box.find("td", string=SUPREME_TOTO_RE)
     if supreme_section:
         table = supreme_section.find_parent("table")
         if table:
@@ -367,50 +1230,43 @@ def extract_lotto(box):
     return star, power, supreme, jackpots
 
 def extract_sportstoto_lotto(box, global_date, global_draw_no):
-    data = base_extract(box, global_date, global_draw_no)
-    data['type'] = 'lotto'
-    data['star'], data['power'], data['supreme'], data['jackpots'] = extract_lotto(box)
-    return data
+    # 4d4d 的 Lotto 区块沿用 4D 的字段（头三奖、特别奖、安慰奖）放在 type 之前
+    base = base_extract(box, global_date, global_draw_no).to_dict()
+    head = {k: v for k, v in base.items() if k not in ("draw_date", "draw_no", "type")}
+    star, power, supreme, jackpots = extract_lotto(box)
+    games = {"star": pack_numbers(star), "power": pack_numbers(power), "supreme": pack_numbers(supreme)}
+    return LottoResult('sportstoto_lotto', base["draw_date"], base["draw_no"], "lotto", games,
+                       head=head, tail={"jackpots": jackpots})
 
 # ---------- 从 4dlatest.org 提取 GDLOTTO 豪龙（增强日期提取）----------
-def extract_gd_lotto_from_4dlatest(soup):
+def extract_gd_lotto_from_4dlatest(soup, sections=None):
     print("🔍 正在从 4dlatest.org 提取 GDLOTTO 豪龙数据...")
-    data = {
-        "draw_date": "",
-        "draw_no": "",
-        "1st": "",
-        "2nd": "",
-        "3rd": "",
-        "special": [],
-        "consolation": [],
-        "jackpot": ""
-    }
-    header = soup.find(string=re.compile(r"GDLOTTO.*豪龙", re.IGNORECASE))
-    if not header:
+    data = FourDResult(tail={"jackpot": ""})
+    headers = (sections or index_4dlatest_sections(soup))["grand_dragon"]
+    if not headers:
         print("⚠️ 未找到 'GDLOTTO 豪龙' 标题")
         return None
-    table = header.find_parent("table")
-    if not table:
-        table = header.find_next("table")
+    header = headers[0]
+    table = section_table(header)
     if not table:
         print("⚠️ 未找到 GDLOTTO 数据表格")
         return None
     header_text = header.get_text(" ", strip=True)
     print(f"📅 标题文本: {header_text}")
-    date_match = re.search(r"(\d{2}/\d{2}/\d{4})", header_text)
+    date_match = SLASH_DATE_RE.search(header_text)
     if not date_match:
-        date_match = re.search(r"(\d{2}-\d{2}-\d{4})", header_text)
+        date_match = DMY_DATE_RE.search(header_text)
     if date_match:
         try:
             d = datetime.strptime(date_match.group(1), "%d/%m/%Y" if '/' in date_match.group(1) else "%d-%m-%Y")
-            data["draw_date"] = d.strftime("%d-%m-%Y")
-            print(f"  ✅ 提取到日期: {data['draw_date']}")
+            data.draw_date = d.strftime("%d-%m-%Y")
+            print(f"  ✅ 提取到日期: {data.draw_date}")
         except:
             pass
-    no_match = re.search(r"#?(\d+/\d+)", header_text)
+    no_match = SLASH_DRAW_NO_RE.search(header_text)
     if no_match:
-        data["draw_no"] = no_match.group(1)
-        print(f"  提取到期号: {data['draw_no']}")
+        data.draw_no = no_match.group(1)
+        print(f"  提取到期号: {data.draw_no}")
 
     rows = table.find_all("tr")
     special_mode = False
@@ -437,9 +1293,9 @@ def extract_gd_lotto_from_4dlatest(soup):
                     consolation_list.append(text)
             continue
         if "JACKPOT" in row_text or "USD" in row_text or "$" in row_text:
-            amount_match = re.search(r'([\d,]+(?:.\d+)?)', row.get_text())
+            amount_match = AMOUNT_RE.search(row.get_text())
             if amount_match:
-                data["jackpot"] = amount_match.group(1)
+                data.tail["jackpot"] = amount_match.group(1)
             continue
         if special_mode:
             for cell in cells:
@@ -455,62 +1311,56 @@ def extract_gd_lotto_from_4dlatest(soup):
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit() and len(text) >= 3:
-                    data["1st"] = text
+                    data.first = pack_number(text)
                     break
         if "2ND" in row_text:
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit() and len(text) >= 3:
-                    data["2nd"] = text
+                    data.second = pack_number(text)
                     break
         if "3RD" in row_text:
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit() and len(text) >= 3:
-                    data["3rd"] = text
+                    data.third = pack_number(text)
                     break
-    data["special"] = list(dict.fromkeys(special_list))[:10]
-    data["consolation"] = list(dict.fromkeys(consolation_list))[:10]
-    print(f"  提取到前三: {data['1st']}, {data['2nd']}, {data['3rd']}")
-    print(f"  特别奖数量: {len(data['special'])}")
-    print(f"  安慰奖数量: {len(data['consolation'])}")
-    print(f"  Jackpot: {data['jackpot']}")
+    # 不截断：多出来的号码说明表格解析有误，交给保存前的校验拦下
+    data.special = pack_numbers(list(dict.fromkeys(special_list)))
+    data.consolation = pack_numbers(list(dict.fromkeys(consolation_list)))
+    print(f"  提取到前三: {', '.join(unpack_numbers((data.first, data.second, data.third)))}")
+    print(f"  特别奖数量: {len(data.special)}")
+    print(f"  安慰奖数量: {len(data.consolation)}")
+    print(f"  Jackpot: {data.tail['jackpot']}")
     return data
 
 # ---------- 从 4dlatest.org 提取 SABAH88 沙巴万字 LOTTO（增强版）----------
-def extract_sabah_lotto_from_4dlatest(soup):
+def extract_sabah_lotto_from_4dlatest(soup, sections=None):
     print("🔍 正在从 4dlatest.org 提取 SABAH88 沙巴万字 LOTTO 数据...")
-    data = {
-        "draw_date": "",
-        "draw_no": "",
-        "winning_numbers": [],
-        "jackpot1": "",
-        "jackpot2": ""
-    }
-    header = soup.find(string=re.compile(r"SABAH88.*LOTTO", re.IGNORECASE))
-    if not header:
+    data = LottoResult("sabah_lotto", games={"winning_numbers": []}, tail={"jackpot1": "", "jackpot2": ""})
+    headers = (sections or index_4dlatest_sections(soup))["sabah_lotto"]
+    if not headers:
         print("❌ 未找到 'SABAH88 LOTTO' 标题")
         return None
-    table = header.find_parent("table")
-    if not table:
-        table = header.find_next("table")
+    header = headers[0]
+    table = section_table(header)
     if not table:
         print("❌ 未找到数据表格")
         return None
     header_text = header.get_text(" ", strip=True)
     print(f"📅 标题文本: {header_text}")
-    date_match = re.search(r"(\d{2}/\d{2}/\d{4})", header_text)
+    date_match = SLASH_DATE_RE.search(header_text)
     if date_match:
         try:
             d = datetime.strptime(date_match.group(1), "%d/%m/%Y")
-            data["draw_date"] = d.strftime("%d-%m-%Y")
-            print(f"  ✅ 提取到日期: {data['draw_date']}")
+            data.draw_date = d.strftime("%d-%m-%Y")
+            print(f"  ✅ 提取到日期: {data.draw_date}")
         except:
             pass
-    no_match = re.search(r"(\d+/\d+)", header_text)
+    no_match = SLASH_DRAW_NO_RE.search(header_text)
     if no_match:
-        data["draw_no"] = no_match.group(1)
-        print(f"  ✅ 提取到期号: {data['draw_no']}")
+        data.draw_no = no_match.group(1)
+        print(f"  ✅ 提取到期号: {data.draw_no}")
 
     rows = table.find_all("tr")
     for row in rows:
@@ -525,83 +1375,77 @@ def extract_sabah_lotto_from_4dlatest(soup):
                 elif text == "+":
                     pass
             if numbers:
-                data["winning_numbers"] = numbers
+                data.games["winning_numbers"] = pack_numbers(numbers)
                 print(f"✅ 提取到开奖号码: {' '.join(numbers)}")
             continue
         if "Jackpot 1" in row_text:
             for cell in cells:
                 text = cell.get_text(strip=True)
-                amount_match = re.search(r'([\d,]+(?:.\d+)?)', text)
+                amount_match = AMOUNT_RE.search(text)
                 if amount_match:
-                    data["jackpot1"] = amount_match.group(1)
-                    print(f"  ✅ Jackpot 1: {data['jackpot1']}")
+                    data.tail["jackpot1"] = amount_match.group(1)
+                    print(f"  ✅ Jackpot 1: {data.tail['jackpot1']}")
                     break
-            if not data["jackpot1"]:
+            if not data.tail["jackpot1"]:
                 next_row = row.find_next_sibling("tr")
                 if next_row:
                     next_cells = next_row.find_all("td")
                     for cell in next_cells:
                         text = cell.get_text(strip=True)
-                        amount_match = re.search(r'([\d,]+(?:.\d+)?)', text)
+                        amount_match = AMOUNT_RE.search(text)
                         if amount_match:
-                            data["jackpot1"] = amount_match.group(1)
-                            print(f"  ✅ Jackpot 1 (下一行): {data['jackpot1']}")
+                            data.tail["jackpot1"] = amount_match.group(1)
+                            print(f"  ✅ Jackpot 1 (下一行): {data.tail['jackpot1']}")
                             break
         if "Jackpot 2" in row_text:
             for cell in cells:
                 text = cell.get_text(strip=True)
-                amount_match = re.search(r'([\d,]+(?:.\d+)?)', text)
+                amount_match = AMOUNT_RE.search(text)
                 if amount_match:
-                    data["jackpot2"] = amount_match.group(1)
-                    print(f"  ✅ Jackpot 2: {data['jackpot2']}")
+                    data.tail["jackpot2"] = amount_match.group(1)
+                    print(f"  ✅ Jackpot 2: {data.tail['jackpot2']}")
                     break
-            if not data["jackpot2"]:
+            if not data.tail["jackpot2"]:
                 next_row = row.find_next_sibling("tr")
                 if next_row:
                     next_cells = next_row.find_all("td")
                     for cell in next_cells:
                         text = cell.get_text(strip=True)
-                        amount_match = re.search(r'([\d,]+(?:.\d+)?)', text)
+                        amount_match = AMOUNT_RE.search(text)
                         if amount_match:
-                            data["jackpot2"] = amount_match.group(1)
-                            print(f"  ✅ Jackpot 2 (下一行): {data['jackpot2']}")
+                            data.tail["jackpot2"] = amount_match.group(1)
+                            print(f"  ✅ Jackpot 2 (下一行): {data.tail['jackpot2']}")
                             break
     return data
 
 # ---------- 从 4dlatest.org 提取 Magnum Jackpot Gold（增强版）----------
-def extract_magnum_jackpot_gold_from_4dlatest(soup):
+def extract_magnum_jackpot_gold_from_4dlatest(soup, sections=None):
     print("🔍 正在从 4dlatest.org 提取 MAGNUM JACKPOT GOLD 数据...")
-    data = {
-        "draw_date": "",
-        "draw_no": "",
-        "groups": [],  # 存放各组号码
-        "jackpots": []  # 存放奖池金额
-    }
+    data = JackpotGoldResult()
     # 放宽正则匹配，支持中文“万能”
-    header = soup.find(string=re.compile(r"MAGNUM.*JACKPOT.*GOLD", re.IGNORECASE))
-    if not header:
+    headers = (sections or index_4dlatest_sections(soup))["magnum_jackpot_gold"]
+    if not headers:
         print("⚠️ 未找到 'MAGNUM JACKPOT GOLD' 标题")
         return None
-    table = header.find_parent("table")
-    if not table:
-        table = header.find_next("table")
+    header = headers[0]
+    table = section_table(header)
     if not table:
         print("⚠️ 未找到数据表格")
         return None
     header_text = header.get_text(" ", strip=True)
     print(f"📅 标题文本: {header_text}")
-    date_match = re.search(r"(\d{2}/\d{2}/\d{4})", header_text)
+    date_match = SLASH_DATE_RE.search(header_text)
     if date_match:
         try:
             d = datetime.strptime(date_match.group(1), "%d/%m/%Y")
-            data["draw_date"] = d.strftime("%d-%m-%Y")
-            print(f"  ✅ 提取到日期: {data['draw_date']}")
+            data.draw_date = d.strftime("%d-%m-%Y")
+            print(f"  ✅ 提取到日期: {data.draw_date}")
         except:
             pass
-    no_match = re.search(r"(\d+/\d+)", header_text)
+    no_match = SLASH_DRAW_NO_RE.search(header_text)
     if no_match:
-        data["draw_no"] = no_match.group(1)
-        print(f"  ✅ 提取到期号: {data['draw_no']}")
+        data.draw_no = no_match.group(1)
+        print(f"  ✅ 提取到期号: {data.draw_no}")
 
     rows = table.find_all("tr")
     current_group = None
@@ -609,10 +1453,10 @@ def extract_magnum_jackpot_gold_from_4dlatest(soup):
     for row in rows:
         row_text = row.get_text()
         cells = row.find_all("td")
-        group_match = re.search(r"GROUP\s+(\d+)", row_text, re.I)
+        group_match = GROUP_RE.search(row_text)
         if group_match:
             if current_group and group_numbers:
-                data["groups"].append({"group": current_group, "numbers": group_numbers.copy()})
+                data.groups.append((current_group, pack_numbers(group_numbers)))
             current_group = group_match.group(1)
             group_numbers = []
             for cell in cells:
@@ -630,49 +1474,44 @@ def extract_magnum_jackpot_gold_from_4dlatest(soup):
                 elif text == "+":
                     group_numbers.append("+")
         if "Jackpot" in row_text or "RM" in row_text:
-            amounts = re.findall(r'RM\s([\d,]+(?:.\d+)?)', row_text)
+            amounts = RM_AMOUNT_RE.findall(row_text)
             if amounts:
-                data["jackpots"].extend(amounts)
+                data.jackpots.extend(amounts)
     if current_group and group_numbers:
-        data["groups"].append({"group": current_group, "numbers": group_numbers.copy()})
+        data.groups.append((current_group, pack_numbers(group_numbers)))
 
-    print(f"  提取到 {len(data['groups'])} 组号码")
-    print(f"  提取到 {len(data['jackpots'])} 个奖池")
+    print(f"  提取到 {len(data.groups)} 组号码")
+    print(f"  提取到 {len(data.jackpots)} 个奖池")
     return data
 
 # ---------- 从 4dlatest.org 提取 Magnum Life ----------
-def extract_magnum_life_from_4dlatest(soup):
+def extract_magnum_life_from_4dlatest(soup, sections=None):
     print("🔍 正在从 4dlatest.org 提取 MAGNUM LIFE 数据...")
-    data = {
-        "draw_date": "",
-        "draw_no": "",
-        "winning_numbers": [],
-        "bonus_numbers": []
-    }
-    header = soup.find(string=re.compile(r"MAGNUM.*LIFE", re.IGNORECASE))
-    if not header:
+    data = LottoResult("magnum_life", games={"winning_numbers": [], "bonus_numbers": []})
+    winning, bonus = data.games["winning_numbers"], data.games["bonus_numbers"]
+    headers = (sections or index_4dlatest_sections(soup))["magnum_life"]
+    if not headers:
         print("⚠️ 未找到 'MAGNUM LIFE' 标题")
         return None
-    table = header.find_parent("table")
-    if not table:
-        table = header.find_next("table")
+    header = headers[0]
+    table = section_table(header)
     if not table:
         print("⚠️ 未找到数据表格")
         return None
     header_text = header.get_text(" ", strip=True)
     print(f"📅 标题文本: {header_text}")
-    date_match = re.search(r"(\d{2}/\d{2}/\d{4})", header_text)
+    date_match = SLASH_DATE_RE.search(header_text)
     if date_match:
         try:
             d = datetime.strptime(date_match.group(1), "%d/%m/%Y")
-            data["draw_date"] = d.strftime("%d-%m-%Y")
-            print(f"  ✅ 提取到日期: {data['draw_date']}")
+            data.draw_date = d.strftime("%d-%m-%Y")
+            print(f"  ✅ 提取到日期: {data.draw_date}")
         except:
             pass
-    no_match = re.search(r"(\d+/\d+)", header_text)
+    no_match = SLASH_DRAW_NO_RE.search(header_text)
     if no_match:
-        data["draw_no"] = no_match.group(1)
-        print(f"  ✅ 提取到期号: {data['draw_no']}")
+        data.draw_no = no_match.group(1)
+        print(f"  ✅ 提取到期号: {data.draw_no}")
 
     rows = table.find_all("tr")
     winning_mode = False
@@ -687,7 +1526,7 @@ def extract_magnum_life_from_4dlatest(soup):
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit():
-                    data["winning_numbers"].append(text)
+                    winning.append(pack_number(text))
             continue
         if "BONUS NUMBERS" in row_text.upper():
             winning_mode = False
@@ -695,35 +1534,36 @@ def extract_magnum_life_from_4dlatest(soup):
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit():
-                    data["bonus_numbers"].append(text)
+                    bonus.append(pack_number(text))
             continue
         if winning_mode:
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit():
-                    data["winning_numbers"].append(text)
+                    winning.append(pack_number(text))
         if bonus_mode:
             for cell in cells:
                 text = cell.get_text(strip=True)
                 if text.isdigit():
-                    data["bonus_numbers"].append(text)
-    print(f"  ✅ 提取到开奖号码: {' '.join(data['winning_numbers'])}")
-    print(f"  ✅ 提取到特别号码: {' '.join(data['bonus_numbers'])}")
+                    bonus.append(pack_number(text))
+    print(f"  ✅ 提取到开奖号码: {' '.join(unpack_numbers(winning))}")
+    print(f"  ✅ 提取到特别号码: {' '.join(unpack_numbers(bonus))}")
     return data
 
 # ---------- 增强版：从 4dlatest.org 提取 Sports Toto 5D/6D/Lotto（通过查找包含 "Sports Toto" 的文本）----------
-def extract_sportstoto_from_4dlatest(soup):
+def extract_sportstoto_from_4dlatest(soup, sections=None):
     """
     从 4dlatest.org 提取 Sports Toto 5D, 6D, Lotto 数据
-    返回 (data_5d, data_6d, data_lotto) 三个字典
+    返回 (FiveDResult, SixDResult, LottoResult)
     """
     print("🔍 正在从 4dlatest.org 提取 Sports Toto 5D/6D/Lotto 数据...")
-    data_5d = {"draw_date": "", "draw_no": "", "type": "5d", "1st": "", "2nd": "", "3rd": "", "4th": "", "5th": "", "6th": ""}
-    data_6d = {"draw_date": "", "draw_no": "", "type": "6d", "1st": "", "2nd": {"main": "", "alt": ""}, "3rd": {"main": "", "alt": ""}, "4th": {"main": "", "alt": ""}, "5th": {"main": "", "alt": ""}}
-    data_lotto = {"draw_date": "", "draw_no": "", "type": "lotto", "star": [], "power": [], "supreme": [], "jackpots": []}
+    data_5d = FiveDResult()
+    data_6d = SixDResult()
+    data_lotto = LottoResult("sportstoto_lotto", kind="lotto", games={"star": [], "power": [], "supreme": []},
+                             tail={"jackpots": []})
 
     # 查找所有包含 "Sports Toto" 的文本节点（忽略大小写和空格）
-    toto_texts = soup.find_all(string=re.compile(r"Sports\s*Toto", re.IGNORECASE))
+    toto_texts = (sections or index_4dlatest_sections(soup))["sportstoto"]
     if not toto_texts:
         print("⚠️ 未找到包含 'Sports Toto' 的文本")
         return None, None, None
@@ -738,18 +1578,18 @@ def extract_sportstoto_from_4dlatest(soup):
             header_row = table.find("tr")
             if header_row:
                 header_text = header_row.get_text(" ", strip=True)
-                date_match = re.search(r"(\d{2}-\d{2}-\d{4})", header_text)
+                date_match = DMY_DATE_RE.search(header_text)
                 if date_match:
-                    data_5d["draw_date"] = data_6d["draw_date"] = data_lotto["draw_date"] = date_match.group(1)
+                    data_5d.draw_date = data_6d.draw_date = data_lotto.draw_date = date_match.group(1)
                     print(f"  ✅ 提取到日期: {date_match.group(1)}")
-                no_match = re.search(r"Draw No:?\s*(\d+-\d+)", header_text, re.IGNORECASE)
+                no_match = TOTO_DRAW_NO_RE.search(header_text)
                 if no_match:
-                    data_5d["draw_no"] = data_6d["draw_no"] = data_lotto["draw_no"] = no_match.group(1)
+                    data_5d.draw_no = data_6d.draw_no = data_lotto.draw_no = no_match.group(1)
                     print(f"  ✅ 提取到期号: {no_match.group(1)}")
 
             # 现在在 table 内部查找 5D, 6D, Lotto 的子表格
             # 5D
-            header_5d = table.find("td", string=re.compile(r"5D"))
+            header_5d = table.find("td", string=TOTO_5D_RE)
             if header_5d:
                 table_5d = header_5d.find_parent("table")
                 if table_5d:
@@ -759,22 +1599,14 @@ def extract_sportstoto_from_4dlatest(soup):
                         if len(tds) >= 2:
                             label = tds[0].get_text(strip=True).lower()
                             number = tds[1].get_text(strip=True)
-                            if "1st" in label:
-                                data_5d["1st"] = number
-                            elif "2nd" in label:
-                                data_5d["2nd"] = number
-                            elif "3rd" in label:
-                                data_5d["3rd"] = number
-                            elif "4th" in label:
-                                data_5d["4th"] = number
-                            elif "5th" in label:
-                                data_5d["5th"] = number
-                            elif "6th" in label:
-                                data_5d["6th"] = number
-                    print(f"  ✅ 提取到 5D: {data_5d['1st']}, {data_5d['2nd']}, {data_5d['3rd']} ...")
+                            for i, name in enumerate(PRIZE_NAMES):
+                                if name in label:
+                                    data_5d.prizes[i] = pack_number(number)
+                                    break
+                    print(f"  ✅ 提取到 5D: {', '.join(unpack_numbers(data_5d.prizes[:3]))} ...")
 
             # 6D
-            header_6d = table.find("td", string=re.compile(r"6D"))
+            header_6d = table.find("td", string=TOTO_6D_RE)
             if header_6d:
                 table_6d = header_6d.find_parent("table")
                 if table_6d:
@@ -785,28 +1617,11 @@ def extract_sportstoto_from_4dlatest(soup):
                         if len(tds) < 2:
                             continue
                         label = tds[0].get_text(strip=True).lower()
-                        if "1st" in label and len(tds) >= 2:
-                            data_6d["1st"] = tds[1].get_text(strip=True)
-                        elif "2nd" in label:
-                            main, alt = extract_6d_pair(row_text)
-                            data_6d["2nd"]["main"] = main
-                            data_6d["2nd"]["alt"] = alt
-                        elif "3rd" in label:
-                            main, alt = extract_6d_pair(row_text)
-                            data_6d["3rd"]["main"] = main
-                            data_6d["3rd"]["alt"] = alt
-                        elif "4th" in label:
-                            main, alt = extract_6d_pair(row_text)
-                            data_6d["4th"]["main"] = main
-                            data_6d["4th"]["alt"] = alt
-                        elif "5th" in label:
-                            main, alt = extract_6d_pair(row_text)
-                            data_6d["5th"]["main"] = main
-                            data_6d["5th"]["alt"] = alt
-                    print(f"  ✅ 提取到 6D: 1st {data_6d['1st']}")
+                        set_6d_prize(data_6d, label, row_text, tds)
+                    print(f"  ✅ 提取到 6D: 1st {unpack_number(data_6d.first)}")
 
             # Lotto (Star Toto 6/50)
-            header_lotto = table.find("td", string=re.compile(r"Star Toto 6/50"))
+            header_lotto = table.find("td", string=STAR_TOTO_RE)
             if header_lotto:
                 table_lotto = header_lotto.find_parent("table")
                 if table_lotto:
@@ -817,24 +1632,27 @@ def extract_sportstoto_from_4dlatest(soup):
                         for td in tds:
                             text = td.get_text(strip=True)
                             if text.isdigit():
-                                data_lotto["star"].append(text)
-                        print(f"  ✅ 提取到 Star Toto 号码: {data_lotto['star']}")
+                                data_lotto.games["star"].append(pack_number(text))
+                        print(f"  ✅ 提取到 Star Toto 号码: {unpack_numbers(data_lotto.games['star'])}")
 
             # 如果成功提取到任何数据，返回
-            if any(data_5d.get(k) for k in ['1st','2nd','3rd','4th','5th','6th']) or \
-               data_6d.get('1st') or data_lotto.get('star'):
+            if data_5d.has_numbers or data_6d.first is not None or data_lotto.games["star"]:
                 return data_5d, data_6d, data_lotto
 
     print("⚠️ 未能从任何包含 'Sports Toto' 的表格中提取到数据")
     return None, None, None
 
 # ---------- 新增：从 4d2ulive.com 获取 Grand Dragon 数据（用于补充日期）----------
-def fetch_grand_dragon_from_4d2ulive():
+def fetch_grand_dragon_from_4d2ulive(html=None):
+    """html 为已并发抓取好的页面时直接解析，否则自行请求"""
     print("🔍 正在从 4d2ulive.com 获取 Grand Dragon 4D 数据...")
-    html = fetch_html(URL_4D2ULIVE)
+    if html is None:
+        html = fetch_html(URL_4D2ULIVE)
     if not html:
         return None
-    soup = BeautifulSoup(html, "html.parser")
+    return extract_grand_dragon_from_4d2ulive(make_soup(html))
+
+def extract_grand_dragon_from_4d2ulive(soup):
     data = {"draw_date": "", "draw_no": "", "1st": "", "2nd": "", "3rd": "", "special": [], "consolation": [], "jackpot": ""}
     
     # 定位 Grand Dragon 区域（根据图片中的标题 "Grand Dragon 4D 豪龙"）
@@ -876,8 +1694,9 @@ def fetch_grand_dragon_from_4d2ulive():
                 if text.isdigit() and len(text) == 4:
                     cons_list.append(text)
         else:
-            # 可能是前三奖行
-            if len(cells) >= 3:
+            # 可能是前三奖行：前三格都是 4 位数字才算，表头、金额等其他三格行跳过
+            texts = [cell.get_text(strip=True) for cell in cells[:3]]
+            if len(texts) == 3 and all(t.isdigit() and len(t) == 4 for t in texts):
                 # 假设顺序：1st, 2nd, 3rd
                 data["1st"] = cells[0].get_text(strip=True)
                 data["2nd"] = cells[1].get_text(strip=True)
@@ -887,90 +1706,513 @@ def fetch_grand_dragon_from_4d2ulive():
     data["consolation"] = cons_list
     return data
 
+# ---------- 各数据源整页提取（只提取不保存）----------
+# 4d4d.co outerbox 分类规则 (公司, 表头正则, 提取函数)，越具体的越靠前。
+# 所有规则合并成一个正则：取最左边的匹配，同一位置按此顺序优先，
+# 因此 "MAGNUM JACKPOT GOLD" / "MAGNUM LIFE" 不会再被 MAGNUM 4D 抢先匹配。
+OUTERBOX_RULES = [
+    # 这两个区块只用来识别（不让 MAGNUM 4D 抢先匹配），不提取：4D 通用函数得到的结构网站无法显示，只用 4dlatest 的结果
+    ('magnum_jackpot_gold', r'MAGNUM.*JACKPOT.*GOLD', None),
+    ('magnum_life', r'MAGNUM.*LIFE', None),
+    ('grand_dragon', r'GRAND\s+DRAGON', extract_grand_dragon),
+    ('damacai_1p3d', r'DA MA CAI 1\+3D', extract_damacai_1p3d),
+    ('sportstoto_5d', r'SPORTSTOTO.*5D', extract_sportstoto_5d),
+    ('sportstoto_6d', r'SPORTSTOTO.*6D', extract_sportstoto_6d),
+    ('sportstoto_lotto', r'SPORTSTOTO.*LOTTO', extract_sportstoto_lotto),
+    ('damacai', r'DAMACAI.*4D', extract_damacai),
+    ('magnum', r'MAGNUM.*4D', extract_magnum),
+    ('toto', r'TOTO.*4D', extract_toto),
+    ('singapore', r'SINGAPORE.*4D', extract_singapore),
+    ('sabah', r'SABAH.*88.*4D', extract_sabah),
+    ('sandakan', r'SANDAKAN.*4D', extract_sandakan),
+    ('sarawak_cashsweep', r'CASHWEEP.*4D', extract_cashsweep),
+]
+OUTERBOX_RE = re.compile("|".join(f"(?P<{key}>{pattern})" for key, pattern, _ in OUTERBOX_RULES), re.I)
+OUTERBOX_EXTRACTORS = {key: func for key, _, func in OUTERBOX_RULES}
+
+def classify_outerbox(box):
+    """
+    先只用表头行的文本分类，表头无法识别时才退回整个 outerbox 的文本
+    返回 (公司 或 None, 用于分类的文本)
+    """
+    header = box.find("tr")
+    text = header.get_text(" ", strip=True) if header else ""
+    match = OUTERBOX_RE.search(text) if text else None
+    if not match:
+        text = box.get_text(" ", strip=True)
+        match = OUTERBOX_RE.search(text)
+    return (match.lastgroup if match else None), text
+
+def extract_4d4d_page(soup):
+    """从 4d4d.co 页面提取所有公司结果，返回 {公司: 结果对象}，同一公司出现多次时以最后一个为准"""
+    results = {}
+    global_date, global_draw_no = timed_call(extract_global_date, soup)
+    print(f"🌍 4d4d.co 全局日期: {global_date}, 全局期号: {global_draw_no}")
+    outer_boxes = soup.find_all("div", class_="outerbox")
+    print(f"📦 找到 {len(outer_boxes)} 个 outerbox")
+
+    processed_companies = set()
+    for idx, box in enumerate(outer_boxes):
+        company_key, box_text = classify_outerbox(box)
+        if company_key and OUTERBOX_EXTRACTORS[company_key] is None:
+            print(f"ℹ️ {company_key} 只采用 4dlatest 的结果，跳过 (outerbox {idx})")
+        elif company_key:
+            print(f"🔍 处理 {company_key} (outerbox {idx})")
+            count("boxes_matched", source="4d4d")
+            data = timed_call(OUTERBOX_EXTRACTORS[company_key], box, global_date, global_draw_no)
+            if data:
+                results[company_key] = data
+            processed_companies.add(company_key)
+        else:
+            # 尝试复合提取 Sports Toto
+            if "SPORTSTOTO" in box_text.upper():
+                print(f"🔍 尝试提取 SportsToto 复合数据 (outerbox {idx})")
+                count("boxes_matched", source="4d4d")
+                data_5d = timed_call(extract_sportstoto_5d, box, global_date, global_draw_no)
+                if data_5d.has_numbers:
+                    results['sportstoto_5d'] = data_5d
+                    processed_companies.add('sportstoto_5d')
+                data_6d = timed_call(extract_sportstoto_6d, box, global_date, global_draw_no)
+                if data_6d.has_numbers:
+                    results['sportstoto_6d'] = data_6d
+                    processed_companies.add('sportstoto_6d')
+                data_lotto = timed_call(extract_sportstoto_lotto, box, global_date, global_draw_no)
+                if data_lotto.has_numbers:
+                    results['sportstoto_lotto'] = data_lotto
+                    processed_companies.add('sportstoto_lotto')
+            else:
+                count("boxes_unrecognised", source="4d4d")
+                print(f"⚠️ 未识别的 outerbox {idx}，内容: {box_text[:100]}...")
+
+    all_possible = {key for key, func in OUTERBOX_EXTRACTORS.items() if func}
+    all_possible.update(['sportstoto_5d', 'sportstoto_6d', 'sportstoto_lotto'])
+    missing = all_possible - processed_companies
+    if missing:
+        print(f"ℹ️ 以下公司当天无数据: {', '.join(missing)}")
+    return results
+
+def extract_4dlatest_page(soup):
+    """从 4dlatest.org 页面提取补充数据，只返回满足保存条件的公司 {公司: 结果对象}"""
+    results = {}
+    sections = timed_call(index_4dlatest_sections, soup)
+
+    # GDLOTTO 豪龙：放宽保存条件，只要有前三或特别/安慰奖就保存
+    gd_data = timed_call(extract_gd_lotto_from_4dlatest, soup, sections)
+    if gd_data and gd_data.has_numbers:
+        results['grand_dragon'] = gd_data
+    else:
+        print("⚠️ GDLOTTO 豪龙数据为空，保留原有数据")
+
+    # SABAH88 沙巴万字 LOTTO
+    sabah_data = timed_call(extract_sabah_lotto_from_4dlatest, soup, sections)
+    if sabah_data and sabah_data.has_numbers:
+        results['sabah_lotto'] = sabah_data
+    else:
+        print("⚠️ SABAH88 沙巴万字 LOTTO 数据为空")
+
+    # MAGNUM JACKPOT GOLD
+    mjg_data = timed_call(extract_magnum_jackpot_gold_from_4dlatest, soup, sections)
+    if mjg_data and mjg_data.has_numbers:
+        results['magnum_jackpot_gold'] = mjg_data
+    else:
+        print("⚠️ MAGNUM JACKPOT GOLD 数据为空")
+
+    # MAGNUM LIFE
+    magnum_life_data = timed_call(extract_magnum_life_from_4dlatest, soup, sections)
+    if magnum_life_data and magnum_life_data.has_numbers:
+        results['magnum_life'] = magnum_life_data
+    else:
+        print("⚠️ MAGNUM LIFE 数据为空")
+
+    # Sports Toto 5D/6D/Lotto
+    toto_5d, toto_6d, toto_lotto = timed_call(extract_sportstoto_from_4dlatest, soup, sections)
+    if toto_5d and toto_5d.has_numbers:
+        results['sportstoto_5d'] = toto_5d
+    if toto_6d and toto_6d.has_numbers:
+        results['sportstoto_6d'] = toto_6d
+    if toto_lotto and toto_lotto.games["star"]:
+        results['sportstoto_lotto'] = toto_lotto
+    return results
+
 # ---------- 从 Singapore Pools 获取 TOTO ----------
-def fetch_singapore_toto_from_official():
+def extract_singapore_toto_link(soup, base_url=URL_SG_TOTO):
+    """从 TOTO 结果列表页找出最新一期的详情链接（带 sppl 参数）"""
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        if 'toto_results.aspx' in href and 'sppl=' in href:
+            return urljoin(base_url, href)
+    return None
+
+def extract_singapore_toto(soup):
+    """解析 TOTO 详情页，返回 LottoResult（winning_numbers 及 prize_table）"""
+    data = LottoResult("singapore_toto", games={"winning_numbers": []}, tail={"prize_table": []})
+    header = soup.find('h2', string=re.compile(r'TOTO Results', re.I))
+    if header:
+        header_text = header.get_text()
+        date_match = re.search(r'(\d{1,2}\s+[A-Za-z]{3}\s+\d{4})', header_text)
+        if date_match:
+            try:
+                d = datetime.strptime(date_match.group(1), "%d %b %Y")
+                data.draw_date = d.strftime("%d-%m-%Y")
+            except:
+                pass
+        no_match = re.search(r'Draw\sNo.?\s(\d+)', header_text, re.I)
+        if no_match:
+            data.draw_no = no_match.group(1)
+    winning_section = soup.find('span', string=re.compile(r'Winning Numbers', re.I))
+    if winning_section:
+        table = winning_section.find_parent('table')
+        if table:
+            numbers = []
+            for td in table.find_all('td'):
+                text = td.get_text(strip=True)
+                if text.isdigit() and 1 <= int(text) <= 49:
+                    numbers.append(text)
+            if len(numbers) >= 7:
+                data.games["winning_numbers"] = pack_numbers(numbers[:6] + [numbers[-1]])
+            elif numbers:
+                data.games["winning_numbers"] = pack_numbers(numbers)
+    prize_header = soup.find('th', string=re.compile(r'Prize Group', re.I))
+    if prize_header:
+        table = prize_header.find_parent('table')
+        if table:
+            rows = table.find_all('tr')[1:]
+            prize_table = []
+            for row in rows:
+                cells = row.find_all('td')
+                if len(cells) >= 3:
+                    group = cells[0].get_text(strip=True)
+                    amount = cells[1].get_text(strip=True)
+                    winners = cells[2].get_text(strip=True)
+                    prize_table.append([group, amount, winners])
+            data.tail["prize_table"] = prize_table
+    return data
+
+def sg_toto_draw_link(draw_no):
+    """详情页链接的 sppl 参数就是 base64("DrawNumber=NNNN")，已知期号时无需请求列表页"""
+    sppl = base64.b64encode(f"DrawNumber={draw_no}".encode("ascii")).decode("ascii")
+    return URL_SG_TOTO_DRAW.format(sppl=sppl)
+
+def sg_toto_link_draw_no(link):
+    """从详情页链接的 sppl 参数解出期号，无法解析时返回 None"""
+    sppl = parse_qs(urlsplit(link or "").query).get("sppl")
+    if not sppl:
+        return None
+    try:
+        text = base64.b64decode(sppl[0]).decode("ascii")
+    except ValueError:
+        return None
+    match = re.fullmatch(r"DrawNumber=(\d+)", text)
+    return int(match.group(1)) if match else None
+
+def resolve_latest_toto_link(force=False):
+    """列表页上最新一期的详情链接；解析结果缓存 SG_TOTO_LINK_TTL 秒，列表页只解析 <a> 标签"""
+    state = load_state(SG_TOTO_STATE_PATH)
+    if not force and state.get("link") and time.time() - state.get("resolved_at", 0) < SG_TOTO_LINK_TTL:
+        print(f"♻️ 使用缓存的最新一期链接（第 {state.get('draw_no')} 期）")
+        return state["link"]
+    r = http_get(URL_SG_TOTO)
+    r.raise_for_status()
+    link = timed_call(extract_singapore_toto_link, make_soup(r.text, parse_only=SoupStrainer("a")), URL_SG_TOTO)
+    if link:
+        print(f"✅ 找到最新结果链接: {link}")
+        with _task_lock:
+            if not task_abandoned():   # 超时放弃后本轮的写入可能已经落盘，不再改动状态
+                save_state(SG_TOTO_STATE_PATH, {"link": link, "draw_no": sg_toto_link_draw_no(link),
+                                                "resolved_at": int(time.time())})
+    return link
+
+def toto_list_check_due():
+    """距上次看列表页已超过 SG_TOTO_LIST_CHECK 秒（非开奖日也要看一次，发现日历之外的特别开奖）"""
+    return time.time() - load_state(SG_TOTO_STATE_PATH).get("resolved_at", 0) >= SG_TOTO_LIST_CHECK
+
+def fetch_singapore_toto_draw(link):
+    """请求一期详情页，结果完整时返回 LottoResult，否则返回 None"""
+    r = http_get(link)
+    r.raise_for_status()
+    data = timed_call(extract_singapore_toto, make_soup(r.text))
+    if data.games["winning_numbers"] and len(data.tail["prize_table"]) >= 6:
+        return data
+    return None
+
+def fetch_singapore_toto_from_official(force=False):
+    """
+    返回 (LottoResult 或 None, 是否无需更新)。已保存的最新一期完整、不早于最近的开奖日（含 TOTO_SPECIAL_DRAW_DATES），
+    且 SG_TOTO_LIST_CHECK 秒内看过列表页时不发任何请求（非开奖日通常如此）；超过这个时间只请求一次列表页，
+    发现日历之外的 Cascade / 特别开奖。已知上一期期号时直接按 sppl 规则请求下一期详情页，只需一次请求；
+    下一期迟迟没有结果或没有已保存的结果时才退回列表页（链接有缓存）。force 时忽略以上捷径
+    """
     print("🔍 正在从 Singapore Pools 官方获取最新 TOTO 数据...")
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    main_url = "https://www.singaporepools.com.sg/en/product/Pages/toto_results.aspx"
+    saved = load_state(os.path.join(DATA_DIR, "singapore_toto.json"))
+    complete = result_complete("singapore_toto", saved)
+    saved_no = int(saved["draw_no"]) if complete and str(saved.get("draw_no", "")).isdigit() else None
+    today = datetime.now(DRAW_TZ).date()
+    last_draw = last_draw_day("singapore_toto", today)
+    saved_date = result_date(saved)
+    up_to_date = not force and complete and saved_date is not None and saved_date >= last_draw
+    if up_to_date:
+        if not toto_list_check_due():
+            print(f"♻️ 已有第 {saved.get('draw_no')} 期的完整结果，最近开奖日 {last_draw} 之后还没有新的一期，不发请求")
+            return None, True
+        print(f"🔎 已有第 {saved.get('draw_no')} 期的完整结果，列表页超过一天没有检查，确认有没有特别开奖")
     try:
-        r = requests.get(main_url, headers=headers, timeout=15)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        latest_link = None
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            if 'toto_results.aspx' in href and 'sppl=' in href:
-                latest_link = urljoin(main_url, href)
-                print(f"✅ 找到最新结果链接: {latest_link}")
-                break
-        if not latest_link:
+        if saved_no and not force and not up_to_date:
+            # 详情页请求出错时不放弃，同样退回列表页
+            try:
+                data = fetch_singapore_toto_draw(sg_toto_draw_link(saved_no + 1))
+            except Exception as e:
+                print(f"⚠️ 第 {saved_no + 1} 期详情页抓取失败（{e}），改用列表页查找最新一期")
+            else:
+                if data and data.draw_no == str(saved_no + 1):
+                    print(f"✅ 成功获取 TOTO 数据: 期号 {data.draw_no}")
+                    return data, False
+                if last_draw >= today:
+                    print(f"⏳ 第 {saved_no + 1} 期还没有结果")
+                    return None, True
+                print(f"⚠️ 第 {saved_no + 1} 期详情页没有结果，改用列表页查找最新一期")
+        link = resolve_latest_toto_link(force)
+        if not link:
             print("❌ 未找到最新结果链接")
-            return None
-        r2 = requests.get(latest_link, headers=headers, timeout=15)
-        r2.raise_for_status()
-        soup2 = BeautifulSoup(r2.text, "html.parser")
-        data = {"draw_date": "", "draw_no": "", "winning_numbers": [], "prize_table": []}
-        header = soup2.find('h2', string=re.compile(r'TOTO Results', re.I))
-        if header:
-            header_text = header.get_text()
-            date_match = re.search(r'(\d{1,2}\s+[A-Za-z]{3}\s+\d{4})', header_text)
-            if date_match:
-                try:
-                    d = datetime.strptime(date_match.group(1), "%d %b %Y")
-                    data["draw_date"] = d.strftime("%d-%m-%Y")
-                except:
-                    pass
-            no_match = re.search(r'Draw\sNo.?\s(\d+)', header_text, re.I)
-            if no_match:
-                data["draw_no"] = no_match.group(1)
-        winning_section = soup2.find('span', string=re.compile(r'Winning Numbers', re.I))
-        if winning_section:
-            table = winning_section.find_parent('table')
-            if table:
-                numbers = []
-                for td in table.find_all('td'):
-                    text = td.get_text(strip=True)
-                    if text.isdigit() and 1 <= int(text) <= 49:
-                        numbers.append(text)
-                if len(numbers) >= 7:
-                    data["winning_numbers"] = numbers[:6] + [numbers[-1]]
-                elif numbers:
-                    data["winning_numbers"] = numbers
-        prize_header = soup2.find('th', string=re.compile(r'Prize Group', re.I))
-        if prize_header:
-            table = prize_header.find_parent('table')
-            if table:
-                rows = table.find_all('tr')[1:]
-                prize_table = []
-                for row in rows:
-                    cells = row.find_all('td')
-                    if len(cells) >= 3:
-                        group = cells[0].get_text(strip=True)
-                        amount = cells[1].get_text(strip=True)
-                        winners = cells[2].get_text(strip=True)
-                        prize_table.append([group, amount, winners])
-                data["prize_table"] = prize_table
-        if data["winning_numbers"] and len(data["prize_table"]) >= 6:
-            print(f"✅ 成功获取 TOTO 数据: 期号 {data['draw_no']}")
-            return data
-        else:
-            print("⚠️ 获取的数据不完整")
-            return None
+            return None, False
+        draw_no = sg_toto_link_draw_no(link)
+        if not force and saved_no and draw_no is not None and draw_no <= saved_no:
+            print(f"♻️ 最新一期第 {draw_no} 期已保存且完整，跳过详情页")
+            return None, True
+        data = fetch_singapore_toto_draw(link)
+        if data:
+            print(f"✅ 成功获取 TOTO 数据: 期号 {data.draw_no}")
+            return data, False
+        print("⚠️ 获取的数据不完整")
+        return None, False
     except Exception as e:
         print(f"❌ 抓取失败: {e}")
-        return None
+        return None, False
 
 # ---------- 保存 JSON 和索引 ----------
-def save_json(company, data):
-    if not data:
+_touched_dates = set()   # 本次运行 save_json 写入过的归档日期 (YYYY-MM-DD)
+
+_file_digests = {}       # 路径 -> 最近一次读到或写入的内容摘要，常驻进程中避免重复读盘比较
+_written_paths = set()   # 实际写入过的文件，常驻模式据此判断是否需要发布
+_deleted_paths = set()   # 删除过的文件（过期的事件流），发布时同步删除
+_pending_writes = None   # 批量写入期间 {路径: 内容}，commit_writes 时统一落盘；None 表示直接写盘
+_pending_appends = {}    # 批量写入期间 {路径: [原文件长度, {偏移: 字节值}, 追加内容]}，只改动这些字节
+_pending_deletes = set() # 批量写入期间待删除的文件，commit_writes 时最后删除
+
+def read_file(path):
+    """读取文件内容（bytes），批量写入期间优先返回尚未落盘的新内容；文件不存在时返回 None"""
+    if _pending_writes is not None and path in _pending_writes:
+        return _pending_writes[path]
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def atomic_write(path, data):
+    """先写同目录下的临时文件再 os.replace，中途崩溃也不会留下写了一半的文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_if_changed(path, content):
+    """内容（str 或 bytes）与现有内容完全一致时不写入，返回是否发生了写入（批量期间为已暂存）"""
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    digest = hashlib.sha256(data).digest()
+    if _file_digests.get(path) == digest:
+        return False
+    if read_file(path) == data:
+        _file_digests[path] = digest
+        return False
+    if _pending_writes is not None:
+        _pending_writes[path] = data
+    else:
+        atomic_write(path, data)
+    _file_digests[path] = digest
+    _written_paths.add(path)
+    return True
+
+def file_size(path):
+    """文件长度，批量写入期间包含尚未落盘的追加内容；文件不存在时为 0"""
+    if path in _pending_appends:
+        size, _, tail = _pending_appends[path]
+        return size + len(tail)
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def append_file(path, data, patches=None, end=None):
+    """
+    在文件末尾追加 data，并把 patches {偏移: 字节值} 改写进已有内容；不重写整个文件，
+    历史库在回填多年数据时不会随文件增长而越写越慢。批量写入期间暂存，由 commit_writes 落盘。
+    end 为追加位置，其后的内容（上次写入中断留下的残余）先截掉
+    """
+    _file_digests.pop(path, None)
+    _written_paths.add(path)
+    if _pending_writes is None:
+        _apply_append(path, patches or {}, data, end)
+        return
+    if path not in _pending_appends:
+        _pending_appends[path] = [file_size(path) if end is None else end, {}, bytearray()]
+    elif end is not None and end < file_size(path):
+        size, staged, tail = _pending_appends[path]
+        if end >= size:
+            del tail[end - size:]
+        else:
+            _pending_appends[path] = [end, {k: v for k, v in staged.items() if k < end}, bytearray()]
+    size, staged, tail = _pending_appends[path]
+    for offset, value in (patches or {}).items():
+        if offset >= size:
+            tail[offset - size] = value
+        else:
+            staged[offset] = value
+    tail += data
+
+def _apply_append(path, patches, data, end=None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        for offset, value in sorted(patches.items()):
+            f.seek(offset)
+            f.write(bytes((value,)))
+        if end is not None:
+            f.truncate(end)
+        f.seek(0, os.SEEK_END)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+_compressors = None
+
+def get_compressors():
+    """PUBLISH_ENCODINGS 中可用的 {扩展名: 压缩函数}"""
+    global _compressors
+    if _compressors is None:
+        _compressors = {}
+        for encoding in PUBLISH_ENCODINGS:
+            if encoding == "gz":
+                _compressors["gz"] = partial(gzip.compress, mtime=0)
+            elif encoding == "br":
+                try:
+                    import brotli
+                except ImportError:
+                    print("ℹ️ 未安装 brotli，跳过 .br 预压缩文件")
+                    continue
+                _compressors["br"] = partial(brotli.compress, mode=brotli.MODE_TEXT)
+            else:
+                print(f"⚠️ 不支持的预压缩格式: {encoding}")
+    return _compressors
+
+def dump_json(data, sort_keys=False):
+    """发布用的 JSON 文本：默认无空白的压缩格式，JSON_DEBUG 时缩进排版"""
+    if JSON_DEBUG:
+        return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys)
+
+def write_published(path, content):
+    """write_if_changed 并同步更新 .gz / .br 副本；副本缺失时（刚开启预压缩）也会补写。返回 JSON 本身是否变化"""
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    changed = write_if_changed(path, data)
+    for ext, compress in get_compressors().items():
+        sibling = f"{path}.{ext}"
+        pending = _pending_writes is not None and sibling in _pending_writes
+        if changed or not (pending or os.path.exists(sibling)):
+            write_if_changed(sibling, compress(data))
+    return changed
+
+def begin_writes():
+    """开始一批写入：之后的 write_if_changed 只暂存在内存，由 commit_writes 一次性落盘"""
+    global _pending_writes
+    _pending_writes = {}
+
+def delete_file(path):
+    """删除文件（过期的事件流），批量写入期间暂存，由 commit_writes 在写入之后删除"""
+    if _pending_writes is None:
+        _apply_delete(path)
+    else:
+        _pending_deletes.add(path)
+
+def _apply_delete(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    _file_digests.pop(path, None)
+    _deleted_paths.add(path)
+
+def commit_writes():
+    global _pending_writes
+    pending, _pending_writes = _pending_writes or {}, None
+    appends = dict(_pending_appends)
+    _pending_appends.clear()
+    deletes = sorted(_pending_deletes)
+    _pending_deletes.clear()
+    # 先追加历史库记录再替换索引，中途出错时索引不会指向不存在的记录
+    for path in sorted(appends):
+        size, patches, tail = appends[path]
+        _apply_append(path, patches, bytes(tail), size)
+    for path in sorted(pending):
+        atomic_write(path, pending[path])
+    for path in deletes:
+        _apply_delete(path)
+    if pending or appends:
+        print(f"💾 本次共写入 {len(pending) + len(appends)} 个文件")
+
+def discard_writes():
+    """
+    放弃尚未落盘的写入（运行中途出错时），磁盘上保持上一次完整运行的结果；
+    内存中依附于这批写入的状态（索引分片、事件、抓取状态等）一并丢弃，下次从磁盘重新载入
+    """
+    global _pending_writes, _source_results, _fetch_state
+    pending, _pending_writes = _pending_writes or {}, None
+    for path in list(pending) + list(_pending_appends):
+        _file_digests.pop(path, None)
+        _written_paths.discard(path)
+    _pending_appends.clear()
+    _pending_deletes.clear()
+    _source_results = None
+    _fetch_state = None
+    _fetch_state_updates.clear()
+    _touched_dates.clear()
+    _lookup_shards.clear()
+    _lookup_dirty.clear()
+    _live_events.clear()
+    _live_seq.clear()
+
+def save_json(company, result, latest=True):
+    """
+    把结果对象序列化一次，写入最新文件及日期归档；latest=False 时（历史回填）只写归档，
+    返回最新文件（latest=False 时为归档）是否变化
+    """
+    if not result:
         print(f"❌ {company} 数据为空，跳过保存")
         return
-    base_dir = "docs/data"
+    base_dir = DATA_DIR
     os.makedirs(base_dir, exist_ok=True)
-    latest_path = os.path.join(base_dir, f"{company}.json")
-    with open(latest_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ 已更新最新文件: {latest_path}")
+    data = result.to_dict()
+    text = dump_json(data)
+    changed = False
+    if latest:
+        latest_path = os.path.join(base_dir, f"{company}.json")
+        previous = load_state(latest_path)
+        changed = write_published(latest_path, text)
+        if changed:
+            print(f"✅ 已更新最新文件: {latest_path}")
+            record_live_changes(company, previous, data)
+        else:
+            print(f"♻️ {latest_path} 内容未变化，跳过写入")
 
     draw_date = data.get("draw_date", "")
     if not draw_date or draw_date == "----":
@@ -982,158 +2224,1125 @@ def save_json(company, data):
         except:
             draw_date = datetime.now().strftime("%Y-%m-%d")
     archive_dir = os.path.join(base_dir, draw_date)
-    os.makedirs(archive_dir, exist_ok=True)
     archive_path = os.path.join(archive_dir, f"{company}.json")
-    with open(archive_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"📁 已归档至: {archive_path}")
+    old_data = load_state(archive_path)
+    archived = write_published(archive_path, text)
+    if archived:
+        print(f"📁 已归档至: {archive_path}")
+        update_number_lookup(company, draw_date, old_data, data)
+    _touched_dates.add(draw_date)
+    try:
+        archive_draw(company, draw_date, data)
+    except Exception as e:
+        print(f"⚠️ 写入列式历史库失败 {company}: {e}")
+    return changed if latest else archived
+
+def write_bundle(directory):
+    """把目录下所有公司的 JSON 合并成一个 bundle.json，前端一次请求即可渲染"""
+    companies = {}
+    for company in PUBLISHED_COMPANIES:
+        data = load_state(os.path.join(directory, f"{company}.json"))
+        if data:
+            companies[company] = data
+    if not companies:
+        return
+    path = os.path.join(directory, BUNDLE_NAME)
+    if write_published(path, dump_json({"companies": companies})):
+        print(f"📦 已更新合并文件: {path}（{len(companies)} 家公司）")
+
+def update_bundles():
+    """重建最新数据及本次运行涉及日期的合并文件"""
+    if not _touched_dates:
+        return
+    write_bundle(DATA_DIR)
+    for draw_date in sorted(_touched_dates):
+        write_bundle(os.path.join(DATA_DIR, draw_date))
+
+def scan_archive_dates():
+    """全量扫描 docs/data 下的日期目录，只在首次运行或 --rebuild-index 时使用"""
+    return sorted((item for item in os.listdir(DATA_DIR)
+                   if ARCHIVE_DATE_RE.fullmatch(item) and os.path.isdir(os.path.join(DATA_DIR, item))),
+                  reverse=True)
 
-def update_dates_index():
-    base_dir = "docs/data"
+def write_date_shards(dates, months):
+    """按月分片的日期索引：dates/index.json 为月份列表，dates/YYYY-MM.json 为该月日期"""
+    by_month = {}
+    for d in dates:
+        by_month.setdefault(d[:7], []).append(d)
+    write_published(os.path.join(DATES_SHARD_DIR, "index.json"), dump_json(sorted(by_month, reverse=True)))
+    for month in months:
+        if month in by_month:
+            write_published(os.path.join(DATES_SHARD_DIR, f"{month}.json"), dump_json(by_month[month]))
+
+def update_dates_index(rebuild=False):
+    """用本次运行写入过的日期增量更新 dates.json 及月份分片，内容不变时不写文件"""
+    base_dir = DATA_DIR
     if not os.path.exists(base_dir):
         return
-    dates = []
-    for item in os.listdir(base_dir):
-        item_path = os.path.join(base_dir, item)
-        if os.path.isdir(item_path) and re.match(r"\d{4}-\d{2}-\d{2}", item):
-            dates.append(item)
-    dates.sort(reverse=True)
     index_path = os.path.join(base_dir, "dates.json")
-    with open(index_path, "w", encoding="utf-8") as f:
-        json.dump(dates, f)
-    print(f"📋 已更新日期索引，共 {len(dates)} 个历史日期")
+    dates = load_state(index_path)
+    if rebuild or not isinstance(dates, list) or read_file(os.path.join(DATES_SHARD_DIR, "index.json")) is None:
+        dates = sorted(set(scan_archive_dates()) | _touched_dates, reverse=True)   # 本批尚未落盘的日期也要算上
+        months = {d[:7] for d in dates}
+    else:
+        dates = sorted(set(dates) | _touched_dates, reverse=True)
+        months = {d[:7] for d in _touched_dates}
+    if write_published(index_path, dump_json(dates)):
+        print(f"📋 已更新日期索引，共 {len(dates)} 个历史日期")
+    else:
+        print("📋 日期索引无变化")
+    write_date_shards(dates, months)
+
+# ---------- 发布清单 ----------
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+def update_publish_manifest():
+    """
+    把已落盘的写入 / 删除中 PUBLISH_ROOT 下的文件合并进发布清单（同一路径以最新内容为准），
+    publish.py 只上传清单里的文件，上传成功后再从清单中移除
+    """
+    root = os.path.normpath(PUBLISH_ROOT) + os.sep
+    paths = sorted(p for p in _written_paths | _deleted_paths if os.path.normpath(p).startswith(root))
+    if not paths:
+        return
+    manifest = load_state(PUBLISH_MANIFEST_PATH)
+    files = manifest.setdefault("files", {})
+    for path in paths:
+        key = os.path.normpath(path).replace(os.sep, "/")
+        if not os.path.exists(path):
+            files[key] = {"deleted": True}
+            continue
+        digest = _file_digests.get(path) or file_sha256(path)
+        files[key] = {"sha256": digest.hex(), "size": os.path.getsize(path)}
+    manifest["updated"] = datetime.now(DRAW_TZ).isoformat(timespec="seconds")
+    # 直接落盘：调用时本轮的批量写入已经提交
+    atomic_write(PUBLISH_MANIFEST_PATH,
+                 json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8"))
+    _deleted_paths.clear()
+    print(f"📤 发布清单记录 {len(paths)} 个文件，共 {len(files)} 个待发布")
+
+# ---------- 列式历史库 ----------
+# 每个号码一条 16 字节定长记录（小端），可直接 numpy.memmap(path, dtype=ARCHIVE_DTYPE)：
+#   date YYYYMMDD (u4) | draw_no 期号数字部分 (u4) | number (u4) | company (u1) | tier (u1) | width 位数 (u1) | flags (u1)
+# 文件只追加；同一期结果变化时追加新记录，并把旧记录的 flags 标记为 ARCHIVE_SUPERSEDED
+ARCHIVE_RECORD = struct.Struct("<IIIBBBB")
+ARCHIVE_DTYPE = [("date", "<u4"), ("draw_no", "<u4"), ("number", "<u4"),
+                 ("company", "u1"), ("tier", "u1"), ("width", "u1"), ("flags", "u1")]
+ARCHIVE_SUPERSEDED = 1
+
+# 公司编号：只能在末尾追加，不能调整顺序
+ARCHIVE_COMPANIES = [
+    'damacai', 'magnum', 'toto', 'singapore', 'damacai_1p3d',
+    'sandakan', 'sarawak_cashsweep', 'sabah', 'sabah_lotto',
+    'grand_dragon', 'singapore_toto', 'sportstoto_lotto',
+    'magnum_jackpot_gold', 'sportstoto_5d', 'sportstoto_6d', 'magnum_life',
+]
+ARCHIVE_COMPANY_IDS = {name: i for i, name in enumerate(ARCHIVE_COMPANIES)}
+
+# 奖项编号：4D 1-5，Sabah 3D 11-13，5D 21-26，6D 31-35（alt 41-45），
+# 乐透 star 51 / power 52 / supreme 53 / winning 54 / bonus 55，Jackpot Gold 第 N 组 60+N。
+# Da Ma Cai 1+3D 用 4D 的奖项编号，号码（如 "926 064"）去掉空格按 6 位存入（width 6）；
+# stats.py 的 4D 统计只取 width 4，不会把它们混进去
+ARCHIVE_TIERS = {
+    "1st": 1, "2nd": 2, "3rd": 3, "special": 4, "consolation": 5,
+    "3d_1st": 11, "3d_2nd": 12, "3d_3rd": 13,
+    "5d_1st": 21, "5d_2nd": 22, "5d_3rd": 23, "5d_4th": 24, "5d_5th": 25, "5d_6th": 26,
+    "6d_1st": 31, "6d_2nd": 32, "6d_3rd": 33, "6d_4th": 34, "6d_5th": 35,
+    "6d_2nd_alt": 42, "6d_3rd_alt": 43, "6d_4th_alt": 44, "6d_5th_alt": 45,
+    "star": 51, "power": 52, "supreme": 53, "winning": 54, "bonus": 55,
+}
+JACKPOT_GOLD_TIER_BASE = 60
+LEADING_DIGITS_RE = re.compile(r"\d+")
+
+def draw_records(data):
+    """把一期结果展开成 (tier, number, width) 列表，占位符（----、*、空）不入库；分段号码合并后入库"""
+    records = []
+
+    def add(tier, value):
+        if isinstance(value, str):
+            value = value.replace(" ", "")
+            if value.isdigit():
+                records.append((tier, int(value), len(value)))
+
+    kind = data.get("type")
+    if kind == "5d":
+        for k in ("1st", "2nd", "3rd", "4th", "5th", "6th"):
+            add(ARCHIVE_TIERS["5d_" + k], data.get(k))
+    elif kind == "6d":
+        add(ARCHIVE_TIERS["6d_1st"], data.get("1st"))
+        for k in ("2nd", "3rd", "4th", "5th"):
+            pair = data.get(k) or {}
+            add(ARCHIVE_TIERS["6d_" + k], pair.get("main"))
+            add(ARCHIVE_TIERS[f"6d_{k}_alt"], pair.get("alt"))
+    else:
+        for k in ("1st", "2nd", "3rd"):
+            add(ARCHIVE_TIERS[k], data.get(k))
+        for k in ("special", "consolation"):
+            for v in data.get(k) or []:
+                add(ARCHIVE_TIERS[k], v)
+        three_d = data.get("3d") or {}
+        for k in ("1st", "2nd", "3rd"):
+            add(ARCHIVE_TIERS["3d_" + k], three_d.get(k))
+        for key, tier in (("star", "star"), ("power", "power"), ("supreme", "supreme"),
+                          ("winning_numbers", "winning"), ("bonus_numbers", "bonus")):
+            for v in data.get(key) or []:
+                add(ARCHIVE_TIERS[tier], v)
+        # 组号文本不可靠（页面上常与号码粘连），按组的先后顺序编号
+        for n, group in enumerate(data.get("groups") or [], 1):
+            for v in group.get("numbers") or []:
+                add(JACKPOT_GOLD_TIER_BASE + n, v)
+    return records
+
+def archive_draw(company, draw_date, data):
+    """把一期结果追加进当年的列式历史库，内容与已入库的相同时不写入"""
+    company_id = ARCHIVE_COMPANY_IDS.get(company)
+    if company_id is None:
+        return
+    records = draw_records(data)
+    if not records:
+        return
+    date_int = int(draw_date.replace("-", ""))
+    no_match = LEADING_DIGITS_RE.match(str(data.get("draw_no") or ""))
+    draw_no = int(no_match.group()) if no_match else 0
+    packed = b"".join(ARCHIVE_RECORD.pack(date_int, draw_no, number, company_id, tier, width, 0)
+                      for tier, number, width in records)
+    digest = hashlib.sha1(packed).hexdigest()
+
+    year = draw_date[:4]
+    bin_path = os.path.join(ARCHIVE_DIR, f"draws-{year}.bin")
+    index_path = os.path.join(ARCHIVE_DIR, f"index-{year}.json")
+    index = load_state(index_path)
+    key = f"{company}|{draw_date}"
+    entry = index.get(key)
+    if entry and entry["digest"] == digest:
+        return
+    # 与索引一起走批量写入，二者要么都落盘要么都不落盘；只追加新记录、改写旧记录的 flags 字节
+    patches = {}
+    if entry:
+        flags_offset = ARCHIVE_RECORD.size - 1
+        for i in range(entry["start"], entry["start"] + entry["count"]):
+            patches[i * ARCHIVE_RECORD.size + flags_offset] = ARCHIVE_SUPERSEDED
+    # 从索引记录到的末尾追加：中断留下的半条或无索引的记录被截掉，不会错位也不会被统计重复计入
+    start = min(archive_end(index), file_size(bin_path) // ARCHIVE_RECORD.size)
+    append_file(bin_path, packed, patches, start * ARCHIVE_RECORD.size)
+    index[key] = {"start": start, "count": len(records), "digest": digest}
+    save_state(index_path, index)
+    print(f"🗄️ 已写入列式历史库: {company} {draw_date}（{len(records)} 条）")
+
+def archive_end(index):
+    """某年索引记录到的记录条数，.bin 中超出的部分是写入中断留下的残余，不属于任何一期"""
+    return max((entry["start"] + entry["count"] for entry in index.values()), default=0)
+
+def load_archive(year):
+    """以 numpy.memmap 只读打开某年的历史库（需要 numpy），使用前请过滤 flags & ARCHIVE_SUPERSEDED"""
+    import numpy as np
+    path = os.path.join(ARCHIVE_DIR, f"draws-{year}.bin")
+    count = 0
+    if os.path.exists(path):
+        index = load_state(os.path.join(ARCHIVE_DIR, f"index-{year}.json"))
+        count = min(archive_end(index), os.path.getsize(path) // ARCHIVE_RECORD.size)
+    if count == 0:
+        return np.zeros(0, dtype=ARCHIVE_DTYPE)
+    return np.memmap(path, dtype=ARCHIVE_DTYPE, mode="r", shape=(count,))
+
+def rebuild_archive():
+    """把 docs/data 下已有的每日归档全部导入列式历史库（已入库的期数会被跳过）"""
+    for draw_date in sorted(scan_archive_dates()):
+        date_dir = os.path.join(DATA_DIR, draw_date)
+        for company in ARCHIVE_COMPANIES:
+            data = load_state(os.path.join(date_dir, f"{company}.json"))
+            if data and isinstance(data, dict):
+                archive_draw(company, draw_date, data)
+
+# ---------- 实时事件流 ----------
+# 每次轮询把各公司最新结果与上一版的字段级差异追加到 live/<当天>.jsonl（只追加，不改写），
+# 前端或 live.py 提供的 SSE 端点按 seq 增量读取，只更新变化的号码格。事件格式：
+#   {"seq": 12, "ts": "...", "company": "magnum", "path": ["special", 3], "value": "1234"}
+#   {"seq": 13, "ts": "...", "company": "magnum", "data": {...}}   换了一期时发送整份结果
+_live_events = []
+_live_seq = {}   # 事件流文件 -> 已写入的最后一个 seq
+
+def diff_fields(old, new, path=()):
+    """逐字段比较，返回 [(路径, 新值)]；列表长度变化时整列表替换，删除的字段新值为 None"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in list(old) + [k for k in new if k not in old]:
+            changes += diff_fields(old.get(key), new.get(key), path + (key,))
+        return changes
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changes = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            changes += diff_fields(a, b, path + (i,))
+        return changes
+    return [] if old == new else [(list(path), new)]
+
+def record_live_changes(company, old, new):
+    stamp = datetime.now(DRAW_TZ).isoformat(timespec="seconds")
+    if not old or old.get("draw_date") != new.get("draw_date") or old.get("draw_no") != new.get("draw_no"):
+        _live_events.append({"ts": stamp, "company": company, "data": new})
+        return
+    for path, value in diff_fields(old, new):
+        _live_events.append({"ts": stamp, "company": company, "path": path, "value": value})
+
+def live_stream_path(day=None):
+    day = day or datetime.now(DRAW_TZ).date()
+    return os.path.join(LIVE_DIR, f"{day.isoformat()}.jsonl")
+
+def last_live_seq(path):
+    if path not in _live_seq:
+        seq = 0
+        try:
+            for line in (read_file(path) or b"").splitlines():
+                if line.strip():
+                    seq = json.loads(line)["seq"]
+        except (ValueError, KeyError):
+            pass
+        _live_seq[path] = seq
+    return _live_seq[path]
+
+def flush_live_events():
+    """把本轮的事件一次性追加到当天的事件流文件，并清理过期的文件"""
+    if not _live_events:
+        return
+    os.makedirs(LIVE_DIR, exist_ok=True)
+    path = live_stream_path()
+    seq = last_live_seq(path)
+    lines = []
+    for event in _live_events:
+        seq += 1
+        lines.append(json.dumps({"seq": seq, **event}, ensure_ascii=False, separators=(",", ":")))
+    # 只追加新行，已有内容不读也不重写
+    append_file(path, ("\n".join(lines) + "\n").encode("utf-8"))
+    _live_seq[path] = seq
+    print(f"📡 已追加 {len(lines)} 条实时事件: {path}")
+    _live_events.clear()
+    oldest = (datetime.now(DRAW_TZ).date() - timedelta(days=LIVE_KEEP_DAYS)).isoformat()
+    for name in os.listdir(LIVE_DIR):
+        if name.endswith(".jsonl") and name[:-len(".jsonl")] < oldest:
+            delete_file(os.path.join(LIVE_DIR, name))
+
+# ---------- 号码反查索引 ----------
+# lookup/NN.json：以号码前两位分片，{"1234": [[公司, 日期, 奖项], ...]}，按日期倒序
+# lookup/ibox/NN.json：以号码各位排序后的组合为键（iBox），{"1234": [[公司, 日期, 奖项, 号码], ...]}
+# 奖项：1 / 2 / 3 头二三奖，S 特别奖，C 安慰奖。只索引 4 位号码，Da Ma Cai 1+3D（"926 064"）不在其列
+LOOKUP_COMPANIES = {'damacai', 'magnum', 'toto', 'singapore',
+                    'sandakan', 'sarawak_cashsweep', 'sabah', 'grand_dragon'}
+LOOKUP_TIERS = {1: "1", 2: "2", 3: "3", 4: "S", 5: "C"}
+
+_lookup_shards = {}    # 分片路径 -> 内容，本次运行内缓存
+_lookup_dirty = set()
+
+def lookup_hits(data):
+    """一期 4D 结果中的 {(号码, 奖项)}"""
+    return {(str(number).zfill(4), LOOKUP_TIERS[tier])
+            for tier, number, width in draw_records(data)
+            if tier in LOOKUP_TIERS and width == 4}
+
+def _lookup_update(path, key, hit, add):
+    if path not in _lookup_shards:
+        _lookup_shards[path] = load_state(path)
+    shard = _lookup_shards[path]
+    hits = shard.setdefault(key, [])
+    if add and hit not in hits:
+        hits.append(hit)
+        hits.sort(key=lambda h: h[1], reverse=True)
+    elif not add and hit in hits:
+        hits.remove(hit)
+    if not hits:
+        del shard[key]
+    _lookup_dirty.add(path)
+
+def update_number_lookup(company, draw_date, old_data, new_data):
+    """按同一期新旧结果的差异增量更新反查索引（只在内存中修改，flush_number_lookup 时写盘）"""
+    if company not in LOOKUP_COMPANIES:
+        return
+    old = lookup_hits(old_data) if old_data else set()
+    new = lookup_hits(new_data)
+    for hits, add in ((old - new, False), (new - old, True)):
+        for number, tier in hits:
+            ibox_key = "".join(sorted(number))
+            _lookup_update(os.path.join(LOOKUP_DIR, f"{number[:2]}.json"), number,
+                           [company, draw_date, tier], add)
+            _lookup_update(os.path.join(LOOKUP_DIR, "ibox", f"{ibox_key[:2]}.json"), ibox_key,
+                           [company, draw_date, tier, number], add)
+
+def flush_number_lookup():
+    for path in sorted(_lookup_dirty):
+        write_published(path, dump_json(_lookup_shards[path], sort_keys=True))
+    if _lookup_dirty:
+        print(f"🔎 已更新号码反查索引 {len(_lookup_dirty)} 个分片")
+    _lookup_dirty.clear()
+
+def rebuild_number_lookup():
+    """从 docs/data 下的每日归档重建整个反查索引"""
+    _lookup_shards.clear()
+    for draw_date in sorted(scan_archive_dates()):
+        for company in LOOKUP_COMPANIES:
+            data = load_state(os.path.join(DATA_DIR, draw_date, f"{company}.json"))
+            if data:
+                update_number_lookup(company, draw_date, None, data)
+    # 旧分片中不再出现的号码也需要清掉，因此全部分片都按重建结果覆盖
+    for path in list(_lookup_shards):
+        _lookup_dirty.add(path)
+    flush_number_lookup()
+    update_publish_manifest()
+
+# ---------- 结果校验 ----------
+# 保存前按 LOTTO_BALLS、*_WIDTH(S)、FOUR_D_GROUPS 等声明逐家公司检查提取结果：号码位数、
+# 特别奖 / 安慰奖个数、乐透球号范围与重复、期号是否倒退。不合格的结果放进 QUARANTINE_DIR，docs/data 保留上次的正常文件
+DRAW_NO_RE = re.compile(r"(\d+)(?:([-/])(\d+))?")
+
+def draw_no_key(draw_no):
+    """期号 "337-26" / "07/03" / "4162" -> (分隔符, (后缀, 序号))，无法识别时返回 None"""
+    match = DRAW_NO_RE.fullmatch(str(draw_no or "").strip())
+    if not match:
+        return None
+    number, sep, suffix = match.groups()
+    return sep, (int(suffix or 0), int(number))
+
+def parse_draw_date(value):
+    try:
+        return datetime.strptime(value, "%d-%m-%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+def width_problems(label, values, widths):
+    """values 与 widths 一一对应；空位和占位符跳过"""
+    problems = []
+    for value, width in zip(values, widths):
+        if value is None or is_placeholder(value):
+            continue
+        if not isinstance(value, int):
+            problems.append(f"{label} 含非数字 {value!r}")
+        elif value & 15 != width:
+            problems.append(f"{label} {unpack_number(value)} 不是 {width} 位")
+    return problems
+
+def group_problems(label, values, groups):
+    """多段号码（"926 064"）逐段检查位数；空位和占位符跳过"""
+    problems = []
+    for value in values:
+        if value is None or is_placeholder(value):
+            continue
+        parts = unpack_number(value).split(" ")
+        if [len(p) for p in parts] != list(groups) or not all(p.isascii() and p.isdigit() for p in parts):
+            problems.append(f"{label} {unpack_number(value)!r} 不是 {' '.join('N' * w for w in groups)} 格式")
+    return problems
+
+def four_d_problems(company, label, values):
+    groups = FOUR_D_GROUPS.get(company)
+    if groups:
+        return group_problems(label, values, groups)
+    return width_problems(label, values, [FOUR_D_WIDTH] * len(values))
+
+def ball_problems(company, result):
+    problems = []
+    for name, numbers in result.games.items():
+        if not game_drawn(numbers):
+            continue
+        balls = [v >> 4 for v in numbers if isinstance(v, int)]
+        others = [v for v in numbers
+                  if v is not None and not isinstance(v, int) and v != "+" and not is_placeholder(v)]
+        limit = LOTTO_BALLS[company].get(name)
+        if others:
+            problems.append(f"{name} 含非数字 {others}")
+        if limit and any(not 1 <= b <= limit for b in balls):
+            problems.append(f"{name} 球号超出 1~{limit}: {unpack_numbers(numbers)}")
+        if len(set(balls)) != len(balls):
+            problems.append(f"{name} 有重复球号: {unpack_numbers(numbers)}")
+        expected = LOTTO_GAMES[company].get(name)
+        if expected and len(balls) > expected:
+            problems.append(f"{name} 有 {len(balls)} 个号码，应为 {expected} 个")
+    return problems
+
+def schema_problems(company, result):
+    expected = result_type(company)
+    if type(result) is not expected:
+        return [f"结果类型 {type(result).__name__} 与 {company} 应有的 {expected.__name__} 不符"]
+    if isinstance(result, FourDResult):
+        problems = four_d_problems(company, "头三奖", (result.first, result.second, result.third))
+        for label, values in (("special", result.special), ("consolation", result.consolation)):
+            if len(values) > PRIZE_LIST_SIZE:
+                problems.append(f"{label} 有 {len(values)} 个号码，应为 {PRIZE_LIST_SIZE} 个")
+            problems += four_d_problems(company, label, values)
+        three_d = result.tail.get("3d") or {}
+        problems += width_problems("3d", pack_numbers(three_d.values()), [THREE_D_WIDTH] * len(three_d))
+        return problems
+    if isinstance(result, FiveDResult):
+        return width_problems("5d", result.prizes, FIVE_D_WIDTHS)
+    if isinstance(result, SixDResult):
+        problems = width_problems("6d 1st", (result.first,), SIX_D_WIDTHS[:1])
+        for name, pair, width in zip(PRIZE_NAMES[1:], result.pairs, SIX_D_WIDTHS[1:]):
+            problems += width_problems(f"6d {name}", pair, (width, width))
+        return problems
+    if isinstance(result, LottoResult):
+        return ball_problems(company, result)
+    bad = [n for _, numbers in result.groups for n in numbers if not isinstance(n, int) and n != "+"]
+    return [f"groups 含非数字 {bad}"] if bad else []
+
+def draw_problems(result, previous):
+    """与上次保存的结果（dict）比较：期号格式相同时不能倒退，期号相同时开奖日期不能变"""
+    old_key, new_key = draw_no_key(previous.get("draw_no")), draw_no_key(result.draw_no)
+    if not old_key or not new_key or old_key[0] != new_key[0]:
+        return []
+    if new_key[1] < old_key[1]:
+        return [f"期号倒退: {previous['draw_no']} -> {result.draw_no}"]
+    old_date, new_date = parse_draw_date(previous.get("draw_date")), parse_draw_date(result.draw_date)
+    if new_key == old_key and old_date and new_date and old_date != new_date:
+        return [f"期号 {result.draw_no} 未变但开奖日期由 {previous['draw_date']} 变为 {result.draw_date}"]
+    return []
+
+def validate_result(company, result, previous=None):
+    """检查结果对象，返回问题列表，空列表表示通过；previous 为上次保存的结果（历史回填时不传）"""
+    problems = []
+    draw_date = result.draw_date or ""
+    if draw_date and not is_placeholder(draw_date):
+        day = parse_draw_date(draw_date)
+        if day is None:
+            problems.append(f"开奖日期格式错误: {draw_date!r}")
+        elif day > datetime.now(DRAW_TZ).date() + timedelta(days=1):
+            problems.append(f"开奖日期在未来: {draw_date}")
+    problems += schema_problems(company, result)
+    if previous:
+        problems += draw_problems(result, previous)
+    return problems
+
+def quarantine_result(company, source, result, problems):
+    """把未通过校验的结果写进隔离区（每家公司只保留最近一份）"""
+    path = os.path.join(QUARANTINE_DIR, f"{company}.json")
+    save_state(path, {"source": source, "problems": problems, "data": result.to_dict()})
+    count("results_quarantined", company=company, source=source)
+    print(f"🚫 {company}（{source}）未通过校验，已隔离至 {path}: {'; '.join(problems)}")
+
+def validate_candidates(company, options, previous_source=None):
+    """
+    过滤 [(数据源, 结果对象)] 中未通过校验的候选结果，返回其余的。
+    各数据源的期号编号方式不同，只有与上次采用的数据源 previous_source 相同时才比较期号
+    """
+    previous = load_state(os.path.join(DATA_DIR, f"{company}.json"))
+    valid = []
+    for source, result in options:
+        problems = validate_result(company, result, previous if source == previous_source else None)
+        if problems:
+            quarantine_result(company, source, result, problems)
+        else:
+            valid.append((source, result))
+    return valid
+
+# ---------- 数据源结果缓存 ----------
+# 各数据源上次的提取结果及每家公司的采用来源，页面未变化时沿用。载入时还原成结果对象后常驻内存，
+# 常驻 / 调度模式各轮之间不再重复读盘和解析；内容有变化时才序列化写回 SOURCE_RESULTS_PATH
+# 文件中另存 "kinds": {数据源: {公司: 结果类名}}，按保存时的类型还原，不按公司推断
+_source_results = None   # {"results": {数据源: {公司: 结果对象}}, "winners": {公司: 数据源}}
+
+def get_source_results():
+    global _source_results
+    if _source_results is None:
+        cache = load_state(SOURCE_RESULTS_PATH)
+        kinds = cache.get("kinds", {})
+        _source_results = {
+            "results": {name: {company: result_from_dict(company, data, kinds.get(name, {}).get(company))
+                               for company, data in results.items()}
+                        for name, results in cache.get("results", {}).items()},
+            "winners": dict(cache.get("winners", {})),
+        }
+    return _source_results
+
+def save_source_results():
+    cache = get_source_results()
+    data = {"results": {name: {company: result.to_dict() for company, result in results.items()}
+                        for name, results in cache["results"].items()},
+            "kinds": {name: {company: type(result).__name__ for company, result in results.items()}
+                      for name, results in cache["results"].items()},
+            "winners": cache["winners"]}
+    # 不排序键：to_dict() 的字段顺序即保存出的 JSON 顺序，载入后原样还原
+    write_if_changed(SOURCE_RESULTS_PATH, json.dumps(data, ensure_ascii=False, indent=2))
 
 # ---------- 主流程 ----------
-def main():
+def main(force=False, rebuild_index=False, sources=None):
+    """
+    抓取并保存一轮结果。sources 为要抓取的数据源名称集合（SOURCE_COMPANIES 的键），
+    None 表示全部；未抓取的页面按“未变化”处理。返回 {数据源: changed / unchanged / failed / skipped}
+    本轮所有文件（结果、合并文件、索引、历史库、抓取状态）先暂存，全部成功后才一次性落盘
+    """
+    reset_metrics()
+    begin_writes()
+    try:
+        with metric_timer("run"):
+            status = run_once(force, rebuild_index, sources)
+    except BaseException:
+        discard_writes()
+        write_metrics()
+        raise
+    with metric_timer("commit_writes"):
+        commit_writes()
+    update_publish_manifest()
+    write_metrics()
+    return status
+
+def extract_4dlatest_source(html, fetched):
+    strainer = SoupStrainer("table") if FOURDLATEST_TABLES_ONLY else None
+    results = extract_4dlatest_page(make_soup(html, parse_only=strainer))
+    gd_data = results.get('grand_dragon')
+    if gd_data:
+        # 尝试从 4d2ulive.com 获取日期补充
+        gd_from_4d2u = fetch_grand_dragon_from_4d2ulive((fetched.get("4d2ulive") or (None,))[0] or "")
+        if gd_from_4d2u and gd_from_4d2u.get('draw_date'):
+            gd_data.draw_date = gd_from_4d2u['draw_date']
+            print(f"  ✅ 从 4d2ulive 补充日期: {gd_from_4d2u['draw_date']}")
+    return results
+
+def extract_singapore_toto_source(data, fetched):
+    return {'singapore_toto': data} if data.games.get('winning_numbers') else {}
+
+# 数据源 -> (抓取函数(force) -> (原始内容, 是否未变化), 提取函数(原始内容, 本轮全部抓取结果) -> {公司: 结果对象})
+SOURCE_FETCHERS = {
+    "4d4d": (partial(fetch_html_if_changed, URL_4D4D), lambda html, fetched: extract_4d4d_page(make_soup(html))),
+    "4dlatest": (partial(fetch_html_if_changed, URL_4DLATEST), extract_4dlatest_source),
+    "singapore_toto": (fetch_singapore_toto_from_official, extract_singapore_toto_source),
+}
+# 辅助数据源：不直接提供公司结果，只在其服务的数据源被抓取时一起抓取
+AUXILIARY_SOURCES = {
+    "4d2ulive": ("4dlatest", lambda force: (fetch_html(URL_4D2ULIVE), False)),   # 给 4dlatest 的豪龙补日期
+}
+
+def source_degraded(entry):
+    """数据源统计（SOURCE_STATS_PATH 中的一项）显示它连续失败或持续偏慢"""
+    return (entry.get("consecutive_failures", 0) >= SOURCE_DEGRADED_FAILURES
+            or entry.get("latency_ms", 0) > SOURCE_SLOW_MS)
+
+def pick_result(company, candidates, stats=None):
+    """
+    candidates 为按优先级排列的 [(数据源, 结果对象)]，返回胜出的一项：
+    有完整结果时只在完整结果中选，开奖日期更新的胜出，日期相同或任一方没有日期时保持优先级顺序。
+    stats 为各数据源的统计，状况不佳的数据源（source_degraded）排到健康的之后，只在结果更新或更完整时胜出
+    """
+    stats = stats or {}
+    candidates = sorted(candidates, key=lambda c: source_degraded(stats.get(c[0], {})))
+    complete = [c for c in candidates if c[1].complete]
+    best = None
+    for source, result in complete or candidates:
+        if best is None:
+            best = (source, result)
+            continue
+        new_date, best_date = parse_result_date(result.draw_date), parse_result_date(best[1].draw_date)
+        if new_date and best_date and new_date > best_date:
+            best = (source, result)
+    return best
+
+def record_source_stats(status, latency):
+    """
+    更新各数据源的连续失败次数与延迟（指数滑动平均，按 SOURCE_LATENCY_STEP_MS 取整）并返回全部统计；
+    每轮的成功 / 失败 / 超时只记入运行指标，状态文件只在数据源状况变化时改变
+    """
+    stats = load_state(SOURCE_STATS_PATH)
+    for name, state in status.items():
+        if state == "skipped":
+            continue
+        count("source_status", source=name, status=state)
+        entry = stats.setdefault(name, {"consecutive_failures": 0})
+        entry["consecutive_failures"] = 0 if state in ("changed", "unchanged") else entry["consecutive_failures"] + 1
+        sample = FETCH_DEADLINE if state == "timeout" else latency.get(name)   # 超时的任务还没有返回耗时
+        if sample is not None:
+            ms = sample * 1000
+            ms = ms if "latency_ms" not in entry else 0.8 * entry["latency_ms"] + 0.2 * ms
+            entry["latency_ms"] = int(round(ms / SOURCE_LATENCY_STEP_MS) * SOURCE_LATENCY_STEP_MS)
+    save_state(SOURCE_STATS_PATH, stats)
+    return stats
+
+def run_once(force, rebuild_index, sources):
     print("🚀 爬虫开始运行")
+    started = time.time()
+    start_run_deadline()
+    sources = set(SOURCE_FETCHERS) if sources is None else set(sources) & set(SOURCE_FETCHERS)
 
-    # 1. 抓取 4d4d.co 数据
-    html_4d4d = fetch_html(URL_4D4D)
-    if html_4d4d:
-        soup_4d4d = BeautifulSoup(html_4d4d, "html.parser")
-        global_date, global_draw_no = extract_global_date(soup_4d4d)
-        print(f"🌍 4d4d.co 全局日期: {global_date}, 全局期号: {global_draw_no}")
-        outer_boxes = soup_4d4d.find_all("div", class_="outerbox")
-        print(f"📦 找到 {len(outer_boxes)} 个 outerbox")
-
-        company_matchers = [
-            (re.compile(r'GRAND\s+DRAGON', re.I), 'grand_dragon', extract_grand_dragon),
-            (re.compile(r'DAMACAI.*4D', re.I), 'damacai', extract_damacai),
-            (re.compile(r'MAGNUM.*4D', re.I), 'magnum', extract_magnum),
-            (re.compile(r'TOTO.*4D', re.I), 'toto', extract_toto),
-            (re.compile(r'SINGAPORE.*4D', re.I), 'singapore', extract_singapore),
-            (re.compile(r'DA MA CAI 1\+3D', re.I), 'damacai_1p3d', extract_damacai_1p3d),
-            (re.compile(r'SABAH.*88.*4D', re.I), 'sabah', extract_sabah),
-            (re.compile(r'SANDAKAN.*4D', re.I), 'sandakan', extract_sandakan),
-            (re.compile(r'CASHWEEP.*4D', re.I), 'sarawak_cashsweep', extract_cashsweep),
-            (re.compile(r'SPORTSTOTO.*5D', re.I), 'sportstoto_5d', extract_sportstoto_5d),
-            (re.compile(r'SPORTSTOTO.*6D', re.I), 'sportstoto_6d', extract_sportstoto_6d),
-            (re.compile(r'SPORTSTOTO.*LOTTO', re.I), 'sportstoto_lotto', extract_sportstoto_lotto),
-            (re.compile(r'MAGNUM.*JACKPOT.*GOLD', re.I), 'magnum_jackpot_gold', extract_grand_dragon),  # 临时用通用函数
-            (re.compile(r'MAGNUM.*LIFE', re.I), 'magnum_life', extract_grand_dragon),  # 临时用通用函数
-        ]
-
-        processed_companies = set()
-        for idx, box in enumerate(outer_boxes):
-            box_text = box.get_text(" ", strip=True)
-            matched = False
-            for pattern, company_key, extract_func in company_matchers:
-                if pattern.search(box_text):
-                    print(f"🔍 处理 {company_key} (outerbox {idx})")
-                    data = extract_func(box, global_date, global_draw_no)
-                    if data:
-                        save_json(company_key, data)
-                    processed_companies.add(company_key)
-                    matched = True
-                    break
-            if not matched:
-                # 尝试复合提取 Sports Toto
-                if "SPORTSTOTO" in box_text.upper():
-                    print(f"🔍 尝试提取 SportsToto 复合数据 (outerbox {idx})")
-                    data_5d = extract_sportstoto_5d(box, global_date, global_draw_no)
-                    if any(data_5d.get(k) for k in ['1st','2nd','3rd','4th','5th','6th']):
-                        save_json('sportstoto_5d', data_5d)
-                        processed_companies.add('sportstoto_5d')
-                    data_6d = extract_sportstoto_6d(box, global_date, global_draw_no)
-                    if data_6d.get('1st') or any(data_6d.get(k, {}).get('main') for k in ['2nd','3rd','4th','5th']):
-                        save_json('sportstoto_6d', data_6d)
-                        processed_companies.add('sportstoto_6d')
-                    data_lotto = extract_sportstoto_lotto(box, global_date, global_draw_no)
-                    if data_lotto.get('star') or data_lotto.get('power') or data_lotto.get('supreme'):
-                        save_json('sportstoto_lotto', data_lotto)
-                        processed_companies.add('sportstoto_lotto')
-                else:
-                    print(f"⚠️ 未识别的 outerbox {idx}，内容: {box_text[:100]}...")
-
-        all_possible = {key for _, key, _ in company_matchers}
-        all_possible.update(['sportstoto_5d', 'sportstoto_6d', 'sportstoto_lotto'])
-        missing = all_possible - processed_companies
-        if missing:
-            print(f"ℹ️ 以下公司当天无数据: {', '.join(missing)}")
-
-    # 2. 从 4dlatest.org 抓取补充数据
-    print("\n🌕 正在从 4dlatest.org 抓取补充数据...")
-    time.sleep(1)
-    html_4dlatest = fetch_html(URL_4DLATEST)
-    if html_4dlatest:
-        soup_4dlatest = BeautifulSoup(html_4dlatest, "html.parser")
-
-        # 2.1 抓取 GDLOTTO 豪龙
-        gd_data = extract_gd_lotto_from_4dlatest(soup_4dlatest)
-        # 放宽保存条件：只要有前三或特别/安慰奖就保存
-        if gd_data and (gd_data.get('1st') or gd_data.get('special') or gd_data.get('consolation')):
-            # 尝试从 4d2ulive.com 获取日期补充
-            gd_from_4d2u = fetch_grand_dragon_from_4d2ulive()
-            if gd_from_4d2u and gd_from_4d2u.get('draw_date'):
-                gd_data['draw_date'] = gd_from_4d2u['draw_date']
-                print(f"  ✅ 从 4d2ulive 补充日期: {gd_from_4d2u['draw_date']}")
-            save_json('grand_dragon', gd_data)
-        else:
-            print("⚠️ GDLOTTO 豪龙数据为空，保留原有数据")
+    # 0. 并发抓取所有互不依赖的数据源，整体耗时约等于最慢的那个，超过 FETCH_DEADLINE 的不再等待
+    tasks = {name: partial(SOURCE_FETCHERS[name][0], force) for name in sources}
+    for name, (parent, func) in AUXILIARY_SOURCES.items():
+        if parent in sources:
+            tasks[name] = partial(func, force)
+    latency = {}
 
-        # 2.2 抓取 SABAH88 沙巴万字 LOTTO
-        sabah_data = extract_sabah_lotto_from_4dlatest(soup_4dlatest)
-        if sabah_data and sabah_data.get('winning_numbers'):
-            save_json('sabah_lotto', sabah_data)
-        else:
-            print("⚠️ SABAH88 沙巴万字 LOTTO 数据为空")
+    def timed(name, func):
+        def run():
+            t0 = time.perf_counter()
+            try:
+                return func()
+            finally:
+                latency[name] = time.perf_counter() - t0
+                observe("source_fetch", latency[name], source=name)
+        return run
 
-        # 2.3 抓取 MAGNUM JACKPOT GOLD
-        mjg_data = extract_magnum_jackpot_gold_from_4dlatest(soup_4dlatest)
-        if mjg_data and (mjg_data.get('groups') or mjg_data.get('jackpots')):
-            save_json('magnum_jackpot_gold', mjg_data)
+    fetched = fetch_concurrently({name: timed(name, func) for name, func in tasks.items()}, timeout=FETCH_DEADLINE)
+    print(f"⏱️ 数据源抓取完成，用时 {time.time() - started:.1f}s")
+
+    # 1. 提取各数据源的结果；未变化或本轮未抓取的数据源沿用上次的提取结果
+    cache = get_source_results()
+    previous = cache["results"]
+    cache_changed = False
+    status, candidates = {}, {}
+    for name, (_, extract) in SOURCE_FETCHERS.items():
+        results = {}
+        if name not in sources:
+            status[name] = "skipped"
+            results = previous.get(name, {})
+        elif name not in fetched:
+            status[name] = "timeout"
         else:
-            print("⚠️ MAGNUM JACKPOT GOLD 数据为空")
+            raw, unchanged = fetched[name] or (None, False)
+            if unchanged:
+                status[name] = "unchanged"
+                results = previous.get(name, {})
+                print(f"♻️ {name} 未变化，沿用上次的提取结果")
+            elif raw:
+                print(f"\n🌕 正在提取 {name} 数据...")
+                with metric_timer("source_extract", source=name):
+                    results = extract(raw, fetched)
+                status[name] = "unchanged" if results == previous.get(name) else "changed"
+                cache_changed |= status[name] == "changed"
+                previous[name] = results
+            else:
+                status[name] = "failed"
+                print(f"❌ 无法获取 {name} 数据")
+        candidates[name] = results
+    for name in AUXILIARY_SOURCES:
+        if name in tasks:
+            status[name] = ("timeout" if name not in fetched else
+                            "changed" if (fetched[name] or (None,))[0] else "failed")
+    stats = record_source_stats(status, latency)
+
+    # 2. 每家公司在各数据源的候选结果中选出一份保存，并记录采用的来源
+    winners = cache["winners"]
+    companies = list(COMPANY_SOURCES) + [c for results in candidates.values() for c in results
+                                         if c not in COMPANY_SOURCES]
+    for company in dict.fromkeys(companies):
+        order = COMPANY_SOURCES.get(company) or [n for n in candidates if company in candidates[n]]
+        options = [(name, candidates[name][company]) for name in order if company in candidates.get(name, {})]
+        if not options:
+            count("companies_skipped")
+            continue
+        with metric_timer("validate", company=company):
+            options = validate_candidates(company, options, winners.get(company))
+        if not options:
+            print(f"🛡️ {company} 没有通过校验的结果，保留上次保存的文件")
+            count("companies_rejected")
+            continue
+        source, result = pick_result(company, options, stats)
+        if source != order[0] or winners.get(company) != source:
+            print(f"🏆 {company} 采用 {source}（候选: {', '.join(n for n, _ in options)}）")
+        cache_changed |= winners.get(company) != source
+        winners[company] = source
+        with metric_timer("save_json", company=company):
+            changed = save_json(company, result)
+        count("companies_saved" if changed else "companies_unchanged")
+    if cache_changed:
+        save_source_results()
+
+    for stage, func in [("update_bundles", update_bundles), ("flush_live_events", flush_live_events),
+                        ("flush_number_lookup", flush_number_lookup),
+                        ("update_dates_index", partial(update_dates_index, rebuild=rebuild_index))]:
+        with metric_timer("stage", stage=stage):
+            func()
+    commit_fetch_state()
+    commit_circuit_state()
+    _touched_dates.clear()
+    print(f"🏁 本次运行总用时 {time.time() - started:.1f}s")
+    return status
+
+# ---------- 调度模式 ----------
+def result_complete(company, data, source=None):
+    """
+    已保存的结果（dict）所有号码位都已填满且没有占位符。
+    source 为结果的来源，它只能提供部分号码组时（SOURCE_GAMES）只要求这些号码组
+    """
+    if not data:
+        return False
+    result = result_from_dict(company, data)
+    games = SOURCE_GAMES.get(source, {}).get(company)
+    if games:
+        return result.complete_for({name: LOTTO_GAMES[company][name] for name in games})
+    return result.complete
+
+def draws_on(company, day):
+    calendar = DRAW_CALENDAR.get(company)
+    if calendar is None:
+        return True
+    special = (TOTO_SPECIAL_DRAW_DATES if company == 'singapore_toto' else
+               SPECIAL_DRAW_DATES if calendar is WED_SAT_SUN else ())
+    return day.weekday() in calendar or day.isoformat() in special
 
-        # 2.4 抓取 MAGNUM LIFE
-        magnum_life_data = extract_magnum_life_from_4dlatest(soup_4dlatest)
-        if magnum_life_data and (magnum_life_data.get('winning_numbers') or magnum_life_data.get('bonus_numbers')):
-            save_json('magnum_life', magnum_life_data)
+def last_draw_day(company, day):
+    """day 当天或之前最近的一个开奖日"""
+    for back in range(7):
+        if draws_on(company, day - timedelta(days=back)):
+            return day - timedelta(days=back)
+    return day
+
+def result_date(data):
+    """已保存的结果（dict）中的开奖日期（date），没有或无法解析时返回 None"""
+    return parse_result_date((data or {}).get("draw_date"))
+
+def parse_result_date(value):
+    value = value or ""
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def pending_companies(day, baseline):
+    """
+    当天开奖但结果还不是最终版本的公司。
+    没有开奖日期的结果（4dlatest 部分公司）以当天首次调度时的内容为基准，内容变化后才算当天的结果；
+    是否完整按 state/source_results.json 记录的采用来源判断（见 SOURCE_GAMES）
+    """
+    pending = []
+    winners = get_source_results()["winners"]
+    for company in DRAW_CALENDAR:
+        if not draws_on(company, day):
+            # TOTO 的 Cascade / 特别开奖不在日历上：非开奖日也每天看一次列表页
+            if company == 'singapore_toto' and toto_list_check_due():
+                pending.append(company)
+            continue
+        path = os.path.join(DATA_DIR, f"{company}.json")
+        data = load_state(path)
+        drawn = result_date(data)
+        if drawn is not None:
+            is_today = drawn == day
         else:
-            print("⚠️ MAGNUM LIFE 数据为空")
+            is_today = bool(data) and hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest() != baseline.get(company)
+        if not (is_today and result_complete(company, data, winners.get(company))):
+            pending.append(company)
+    return pending
 
-        # 2.5 抓取 Sports Toto 5D/6D/Lotto
-        toto_5d, toto_6d, toto_lotto = extract_sportstoto_from_4dlatest(soup_4dlatest)
-        if toto_5d and any(toto_5d.get(k) for k in ['1st','2nd','3rd','4th','5th','6th']):
-            save_json('sportstoto_5d', toto_5d)
-        if toto_6d and (toto_6d.get('1st') or any(toto_6d.get(k, {}).get('main') for k in ['2nd','3rd','4th','5th'])):
-            save_json('sportstoto_6d', toto_6d)
-        if toto_lotto and toto_lotto.get('star'):
-            save_json('sportstoto_lotto', toto_lotto)
+def content_digests():
+    digests = {}
+    for company in DRAW_CALENDAR:
+        data = load_state(os.path.join(DATA_DIR, f"{company}.json"))
+        if data:
+            digests[company] = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return digests
 
-    else:
-        print("❌ 无法获取 4dlatest.org 页面")
-
-    # 3. 从 Singapore Pools 获取 TOTO
-    print("\n🌕 正在从官方获取最新 Singapore TOTO 数据...")
-    time.sleep(1)
-    toto_data = fetch_singapore_toto_from_official()
-    if toto_data and toto_data.get('winning_numbers'):
-        save_json('singapore_toto', toto_data)
-    else:
-        print("⚠️ Singapore TOTO 数据为空")
+def in_live_window(now):
+    return LIVE_WINDOW[0] <= now.time() <= LIVE_WINDOW[1]
+
+def run_schedule(max_minutes=0, force=False, live_interval=None, on_change=None):
+    """
+    调度模式：只抓取仍有未完成公司的数据源，页面未变化时逐步拉长该数据源的间隔，
+    直播时段内缩短间隔，所有当天开奖的公司结果都完整后立即退出。
+    max_minutes 为 0 时只检查一轮（配合 cron 每次触发），大于 0 时在该时长内常驻轮询。
+    live_interval 覆盖直播时段的轮询间隔；on_change 为每轮有文件写入后执行的 shell 命令（如发布）。
+    间隔与退避状态保存在 state/schedule.json，跨 cron 触发继续生效。返回是否已全部完成
+    """
+    deadline = time.time() + max_minutes * 60
+    today = datetime.now(DRAW_TZ).date()
+    state = load_state(SCHEDULE_STATE_PATH)
+    if state.get("day") != today.isoformat():
+        state = {"day": today.isoformat(), "baseline": content_digests(), "final": False,
+                 "backoff": {}, "next_poll": {}}
+    backoff, next_poll = state["backoff"], state["next_poll"]
+    polls = 0
+
+    while True:
+        pending = pending_companies(today, state["baseline"])
+        state["final"] = not pending
+        if not pending:
+            print(f"🎉 {today} 所有开奖公司的结果均已完整（本次轮询 {polls} 次）")
+            break
+        wanted = {name for name, companies in SOURCE_COMPANIES.items() if set(companies) & set(pending)}
+        now = time.time()
+        due = {name for name in wanted if next_poll.get(name, 0) <= now}
+        if due:
+            polls += 1
+            print(f"\n⏰ 第 {polls} 次轮询 {', '.join(sorted(due))}，未完成: {', '.join(pending)}")
+            status = main(force=force and polls == 1, sources=due)
+            if on_change and _written_paths:
+                print(f"📤 本轮写入 {len(_written_paths)} 个文件，执行: {on_change}")
+                subprocess.run(on_change, shell=True)
+            _written_paths.clear()
+            interval = ((live_interval or LIVE_POLL_INTERVAL) if in_live_window(datetime.now(DRAW_TZ))
+                        else POLL_INTERVAL)
+            for name in due:
+                if status.get(name) == "unchanged":
+                    backoff[name] = min(backoff.get(name, 1) * 2, MAX_BACKOFF)
+                else:
+                    backoff[name] = 1
+                next_poll[name] = time.time() + interval * backoff[name]
+            save_state(SCHEDULE_STATE_PATH, state)
+            if max_minutes:
+                continue
+        elif not max_minutes:
+            print(f"💤 数据源均在退避中，本次不抓取（未完成: {', '.join(pending)}）")
+        if not max_minutes:
+            state["final"] = not pending_companies(today, state["baseline"])
+            break
+        wake = min(next_poll[name] for name in wanted)
+        if wake >= deadline:
+            print(f"⌛ 已到调度时限，仍未完成: {', '.join(pending)}（本次轮询 {polls} 次）")
+            break
+        time.sleep(max(0.0, wake - time.time()))
+    save_state(SCHEDULE_STATE_PATH, state)
+    return state["final"]
+
+def run_daemon(interval=DAEMON_POLL_INTERVAL, max_minutes=None, force=False, on_change=None):
+    """
+    常驻模式：在开奖时段内保持进程、连接池和抓取状态不退出，按自己的计时器轮询，
+    每轮只解析变化了的页面、只写入内容变化的文件。默认运行到当天直播时段结束
+    """
+    if max_minutes is None:
+        now = datetime.now(DRAW_TZ)
+        end = datetime.combine(now.date(), LIVE_WINDOW[1], tzinfo=DRAW_TZ)
+        max_minutes = max((end - now).total_seconds() / 60, 1)
+    print(f"🛰️ 常驻模式启动，直播时段每 {interval}s 轮询一次，最长运行 {max_minutes:.0f} 分钟")
+    try:
+        return run_schedule(max_minutes=max_minutes, force=force, live_interval=interval, on_change=on_change)
+    except KeyboardInterrupt:
+        print("\n🛑 已停止常驻模式")
+        return False
+
+# ---------- 历史回填 ----------
+def damacai_past_dates():
+    """Da Ma Cai 全部历史开奖日期 (YYYYMMDD)"""
+    r = http_get(URL_DAMACAI_DATES, headers={"Accept": "application/json"})
+    r.raise_for_status()
+    return r.json().get("drawdate", "").split()
+
+def parse_damacai_past(payload, date):
+    """把 Da Ma Cai 某期结果的 JSON 转成与 4d4d.co 提取结果相同的 FourDResult"""
+    def numbers(key):
+        values = payload.get(key) or []
+        return [str(v) for v in values if v and str(v) not in ("-", "null", "----")] if isinstance(values, list) else []
 
+    def prize(*keys):
+        for key in keys:
+            value = str(payload.get(key) or "")
+            if value.isdigit() and len(value) == 4:
+                return value
+        return ""
+
+    return FourDResult(f"{date[6:8]}-{date[4:6]}-{date[:4]}", str(payload.get("drawNo") or ""),
+                       pack_number(prize("firstPrize4D", "FirstPrize4D")),
+                       pack_number(prize("secondPrize4D", "SecondPrize4D")),
+                       pack_number(prize("thirdPrize4D", "ThirdPrize4D")),
+                       pack_numbers(numbers("starterList")), pack_numbers(numbers("consolidateList")),
+                       tail={"type": None})
+
+def fetch_damacai_past(date):
+    """先用 callpassresult 换取该期结果的链接，再取结果 JSON；没有结果时返回 None"""
+    r = http_get(URL_DAMACAI_PAST.format(date=date), headers={"Accept": "application/json", "cookiesession": "363"})
+    r.raise_for_status()
+    link = r.json().get("link")
+    if not link:
+        return None
+    r2 = http_get(link, headers={"Accept": "application/json"})
+    r2.raise_for_status()
+    return parse_damacai_past(r2.json(), date)
+
+# 有历史接口的公司 -> (列出历史开奖日期 () -> [YYYYMMDD], 取某期结果 (YYYYMMDD) -> 结果对象 或 None)
+HISTORY_SOURCES = {
+    "damacai": (damacai_past_dates, fetch_damacai_past),
+}
+
+def flush_backfill(checkpoint):
+    """把这一批回填的归档、合并文件、索引和断点一起落盘"""
+    update_bundles()
+    flush_number_lookup()
     update_dates_index()
+    save_state(BACKFILL_CHECKPOINT_PATH, {c: sorted(set(dates)) for c, dates in checkpoint.items()})
+    commit_circuit_state()
+    commit_writes()
+    update_publish_manifest()
+    _written_paths.clear()   # 已记入清单；不清空的话之后每批都要把回填过的全部文件重新统计一遍
+    _touched_dates.clear()
+
+def run_backfill(start, end, companies=None, workers=BACKFILL_WORKERS, rate=BACKFILL_RATE, force=False):
+    """
+    回填 start ~ end (YYYY-MM-DD) 之间的历史开奖：各期由 workers 个线程并发抓取，每个主机限速 rate 次/秒，
+    结果只写入日期归档（不覆盖最新文件）。每 BACKFILL_BATCH 期连同断点一起落盘，中断后再次运行会跳过已完成的期数
+    """
+    companies = companies or list(HISTORY_SOURCES)
+    for company in companies:
+        if company not in HISTORY_SOURCES:
+            print(f"⚠️ {company} 没有可用的历史接口，跳过")
+    companies = [c for c in companies if c in HISTORY_SOURCES]
+    start, end = start.replace("-", ""), end.replace("-", "")
+    checkpoint = {c: list(dates) for c, dates in load_state(BACKFILL_CHECKPOINT_PATH).items()}
+    set_host_rate(rate)
+
+    jobs = []
+    for company in companies:
+        list_dates, fetch_draw = HISTORY_SOURCES[company]
+        try:
+            dates = sorted(d for d in list_dates() if start <= d <= end)
+        except (requests.RequestException, ValueError) as e:
+            print(f"❌ 获取 {company} 历史开奖日期失败: {e}")
+            continue
+        done = set() if force else set(checkpoint.get(company, []))
+        todo = [d for d in dates if d not in done]
+        print(f"🗂️ {company}: {start}~{end} 共 {len(dates)} 期，已完成 {len(dates) - len(todo)} 期，待回填 {len(todo)} 期")
+        jobs += [(company, d, fetch_draw) for d in todo]
+    if not jobs:
+        set_host_rate(None)
+        return
+
+    started = time.time()
+    saved = failed = pending = 0
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {pool.submit(fetch_draw, d): (company, d) for company, d, fetch_draw in jobs}
+    begin_writes()
+    try:
+        for future in as_completed(futures):
+            company, d = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # 接口返回意料之外的内容（如 r.json() 是列表时的 AttributeError）只算这一期失败，不中断整个回填
+                print(f"❌ {company} {d} 抓取失败: {type(e).__name__}: {e}")
+                failed += 1
+                continue
+            if not result:
+                print(f"⚠️ {company} {d} 没有结果")
+                failed += 1
+                continue
+            problems = validate_result(company, result)
+            if problems:
+                quarantine_result(company, "backfill", result, problems)
+                failed += 1
+                continue
+            save_json(company, result, latest=False)
+            checkpoint.setdefault(company, []).append(d)
+            saved += 1
+            pending += 1
+            if pending >= BACKFILL_BATCH:
+                flush_backfill(checkpoint)
+                print(f"⏳ 已回填 {saved}/{len(jobs)} 期，用时 {time.time() - started:.0f}s")
+                begin_writes()
+                pending = 0
+        flush_backfill(checkpoint)
+    except BaseException:
+        discard_writes()
+        pool.shutdown(wait=False, cancel_futures=True)
+        print(f"🛑 回填中断，已落盘的 {saved - pending} 期下次运行时会跳过")
+        raise
+    finally:
+        set_host_rate(None)
+    pool.shutdown()
+    print(f"🏁 回填完成：成功 {saved} 期，失败 {failed} 期，用时 {time.time() - started:.1f}s")
+
+# ---------- 性能剖析 ----------
+PROFILE_DIR = "profile"   # --profile 的默认输出目录
+PROFILE_TOP = 30          # 报告中列出的函数 / 内存分配位置条数
+
+def profile_call(func, out_dir=PROFILE_DIR, top=PROFILE_TOP):
+    """
+    用 cProfile 与 tracemalloc 包住 func 运行一次，写出：
+        crawler.prof    完整的 cProfile 统计（python -m pstats / snakeviz 打开）
+        report.txt      按累计 / 自身耗时排序的函数及内存分配最多的代码行
+        profile.json    同样内容的机器可读版本，便于在 CI 中对比不同提交
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(os.path.join(out_dir, "crawler.prof"))
+        write_profile_report(profiler, snapshot, peak, out_dir, top)
+
+def write_profile_report(profiler, snapshot, peak, out_dir, top):
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        functions.append({"function": f"{os.path.basename(filename)}:{line}({name})", "calls": ncalls,
+                          "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)})
+    allocations = [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                   for stat in snapshot.statistics("lineno")[:top]]
+    report = {
+        "total_seconds": round(stats.total_tt, 6),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "by_cumtime": sorted(functions, key=lambda f: -f["cumtime"])[:top],
+        "by_tottime": sorted(functions, key=lambda f: -f["tottime"])[:top],
+        "allocations": allocations,
+    }
+    with open(os.path.join(out_dir, "profile.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    text = io.StringIO()
+    text.write(f"总耗时 {report['total_seconds']:.3f}s，内存峰值 {report['peak_memory_kb']:.0f} KB\n\n")
+    for key in ("cumulative", "tottime"):
+        pstats.Stats(profiler, stream=text).sort_stats(key).print_stats(top)
+    text.write(f"内存分配最多的 {top} 处代码\n")
+    for a in allocations:
+        text.write(f"{a['size_kb']:>10.1f} KB {a['count']:>8} 次  {a['site']}\n")
+    with open(os.path.join(out_dir, "report.txt"), "w", encoding="utf-8") as f:
+        f.write(text.getvalue())
+
+    print(f"🔬 剖析结果已写入 {out_dir}/（crawler.prof、report.txt、profile.json）")
+    print(f"🔬 总耗时 {report['total_seconds']:.3f}s，内存峰值 {report['peak_memory_kb']:.0f} KB；累计耗时最多的函数:")
+    for f in report["by_cumtime"][:10]:
+        print(f"    {f['cumtime']:8.3f}s  {f['function']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="4D 开奖结果爬虫")
+    parser.add_argument("--force", action="store_true", help="忽略抓取状态，强制重新解析所有页面")
+    parser.add_argument("--rebuild-index", action="store_true", help="全量扫描 docs/data 重建日期索引")
+    parser.add_argument("--rebuild-archive", action="store_true", help="把 docs/data 下已有的每日归档导入列式历史库后退出")
+    parser.add_argument("--rebuild-lookup", action="store_true", help="从每日归档重建号码反查索引后退出")
+    parser.add_argument("--schedule", action="store_true", help="调度模式：按开奖日历轮询，结果全部完整后提前退出")
+    parser.add_argument("--max-minutes", type=float, default=0, help="调度模式常驻轮询的最长时间（分钟），0 表示只检查一轮")
+    parser.add_argument("--daemon", action="store_true", help="常驻模式：在开奖时段内保持进程运行并按计时器轮询")
+    parser.add_argument("--interval", type=int, default=DAEMON_POLL_INTERVAL, help="常驻模式直播时段的轮询间隔（秒）")
+    parser.add_argument("--on-change", metavar="CMD", help="调度 / 常驻模式下每轮写入文件后执行的命令，例如提交并推送")
+    parser.add_argument("--parser", choices=["html.parser", "lxml", "html5lib"], help="HTML 解析后端（默认取 CRAWLER_PARSER 环境变量）")
+    parser.add_argument("--metrics", metavar="PATH", help=f"每轮运行的 JSON 指标文件（默认 {METRICS_PATH}）")
+    parser.add_argument("--prometheus", metavar="PATH", help="同时写出 Prometheus 文本格式的指标（默认取 CRAWLER_PROMETHEUS 环境变量）")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help=f"用 cProfile + tracemalloc 剖析本次运行，结果写入 DIR（默认 {PROFILE_DIR}）")
+    parser.add_argument("--fixtures", metavar="DIR", help="离线回放：读取 bench.py record 录制的页面，不访问网络")
+    commands = parser.add_subparsers(dest="command")
+    backfill = commands.add_parser("backfill", help="回填历史开奖结果到日期归档（可中断后续跑）")
+    backfill.add_argument("--from", dest="start", required=True, metavar="YYYY-MM-DD")
+    backfill.add_argument("--to", dest="end", default=datetime.now(DRAW_TZ).strftime("%Y-%m-%d"), metavar="YYYY-MM-DD")
+    backfill.add_argument("--companies", help=f"逗号分隔的公司（默认全部有历史接口的: {', '.join(HISTORY_SOURCES)}）")
+    backfill.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="同时抓取的期数")
+    backfill.add_argument("--rate", type=float, default=BACKFILL_RATE, help="每个主机每秒最多请求数")
+    backfill.add_argument("--force", action="store_true", help="忽略断点，重新抓取范围内的全部期数")
+    args = parser.parse_args()
+    if args.parser:
+        HTML_PARSER = args.parser
+    if args.metrics:
+        METRICS_PATH = args.metrics
+    if args.prometheus:
+        PROMETHEUS_PATH = args.prometheus
+    if args.fixtures:
+        use_fixtures(args.fixtures)
+    if args.command == "backfill":
+        run = partial(run_backfill, args.start, args.end,
+                      companies=args.companies.split(",") if args.companies else None,
+                      workers=args.workers, rate=args.rate, force=args.force)
+    elif args.rebuild_archive:
+        run = rebuild_archive
+    elif args.rebuild_lookup:
+        run = rebuild_number_lookup
+    elif args.daemon:
+        run = partial(run_daemon, interval=args.interval, max_minutes=args.max_minutes or None,
+                      force=args.force, on_change=args.on_change)
+    elif args.schedule:
+        run = partial(run_schedule, max_minutes=args.max_minutes, force=args.force, on_change=args.on_change)
+    else:
+        run = partial(main, force=args.force, rebuild_index=args.rebuild_index)
+    if args.profile:
+        FETCH_WORKERS = 1   # 抓取线程里的解析 cProfile 统计不到，剖析时改为串行
+        profile_call(run, args.profile)
+    else:
+        run()
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+实时事件流的本地 SSE 端点，同时提供 docs/ 下的静态网站，方便在本机或自建主机上预览直播效果
+
+    python live.py                    # http://localhost:8765/ 网站，/events 事件流
+    python live.py --port 9000
+
+/events 持续读取爬虫追加的 docs/data/live/<当天>.jsonl，把新行以 Server-Sent Events
+推送给浏览器（event id 即 seq）。断线重连时浏览器带上 Last-Event-ID，或用 ?since=<seq>，
+只补发之后的事件。跨过午夜时自动切换到新一天的文件。
+"""
+import argparse
+import json
+import os
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import crawler
+
+SITE_DIR = "docs"
+POLL_SECONDS = 1        # 检查事件流文件新增内容的间隔
+KEEPALIVE_SECONDS = 15  # 没有新事件时发送注释行，防止代理断开连接
+
+
+def read_events(path, offset):
+    """从 offset 开始读取完整的行，返回 ([事件], 新 offset)；未写完的最后一行留到下次"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except OSError:
+        return [], offset
+    end = chunk.rfind(b"\n") + 1
+    events = [json.loads(line) for line in chunk[:end].splitlines() if line.strip()]
+    return events, offset + end
+
+
+class LiveHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/events":
+            self.stream_events(parse_qs(parts.query))
+        else:
+            super().do_GET()
+
+    def stream_events(self, query):
+        try:
+            since = int(self.headers.get("Last-Event-ID") or query.get("since", ["0"])[0] or 0)
+        except ValueError:
+            since = 0   # 不是数字时从当天第一条补发
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        path, offset = crawler.live_stream_path(), 0
+        last_sent = time.time()
+        try:
+            while True:
+                today = crawler.live_stream_path()
+                if today != path:
+                    path, offset, since = today, 0, 0
+                events, offset = read_events(path, offset)
+                for event in events:
+                    if event["seq"] <= since:
+                        continue
+                    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+                    self.wfile.write(f"id: {event['seq']}\ndata: {data}\n\n".encode("utf-8"))
+                    since = event["seq"]
+                if events:
+                    self.wfile.flush()
+                    last_sent = time.time()
+                elif time.time() - last_sent >= KEEPALIVE_SECONDS:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    last_sent = time.time()
+                time.sleep(POLL_SECONDS)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="实时事件流 SSE 端点 + 静态网站")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    handler = partial(LiveHandler, directory=os.path.abspath(SITE_DIR))
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"📡 网站: http://{args.host}:{args.port}/  事件流: http://{args.host}:{args.port}/events")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+号码统计：从列式历史库 (archive/draws-YYYY.bin) 批量计算各公司的冷热号、
+各位数字频率、遗漏期数与重复率，预先输出为静态 JSON 供网站直接读取
+
+    docs/data/stats/index.json           已生成统计的公司列表
+    docs/data/stats/<公司>.json          汇总（冷热号、位数字频率、重复率）
+    docs/data/stats/<公司>_numbers.json  4D 公司 0000-9999 每个号码的出现次数与遗漏期数
+
+用法:
+    python stats.py                  # 全部年份、全部公司
+    python stats.py --recent 100     # 热号只统计最近 100 期
+
+需要 numpy。所有统计都在整张表上向量化完成，不在 Python 里逐期循环。
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+
+import crawler
+
+STATS_DIR = os.path.join(crawler.DATA_DIR, "stats")
+TOP_N = 20
+FOUR_D_TIERS = [crawler.ARCHIVE_TIERS[k] for k in ("1st", "2nd", "3rd", "special", "consolation")]
+LOTTO_TIERS = {crawler.ARCHIVE_TIERS[k]: k for k in ("star", "power", "supreme", "winning", "bonus")}
+FIRST_PRIZE_TIERS = {crawler.ARCHIVE_TIERS["5d_1st"]: "5d", crawler.ARCHIVE_TIERS["6d_1st"]: "6d"}
+BALL_BITS = np.arange(64, dtype=np.uint64)
+
+
+def load_rows():
+    """读取所有年份的历史库并去掉已被替换的旧记录"""
+    if not os.path.isdir(crawler.ARCHIVE_DIR):
+        return np.zeros(0, dtype=crawler.ARCHIVE_DTYPE)
+    years = sorted(m.group(1) for name in os.listdir(crawler.ARCHIVE_DIR)
+                   if (m := re.fullmatch(r"draws-(\d{4})\.bin", name)))
+    parts = [crawler.load_archive(year) for year in years]
+    if not parts:
+        return np.zeros(0, dtype=crawler.ARCHIVE_DTYPE)
+    rows = np.concatenate(parts)
+    return rows[(rows["flags"] & crawler.ARCHIVE_SUPERSEDED) == 0]
+
+
+def draw_index(dates):
+    """把开奖日期映射为按时间顺序的期序号，返回 (期序号数组, 期数, 最新日期)"""
+    unique_dates, idx = np.unique(dates, return_inverse=True)
+    return idx, len(unique_dates), int(unique_dates[-1]) if len(unique_dates) else None
+
+
+def top(values, n, numbers=None, width=4):
+    """取 values 最大的 n 个，返回 [[号码, 值], ...]，同值按号码升序"""
+    numbers = np.arange(len(values)) if numbers is None else numbers
+    order = np.lexsort((numbers, -values))[:n]
+    return [[str(int(numbers[i])).zfill(width), int(values[i])] for i in order]
+
+
+def four_d_stats(rows, recent):
+    numbers = rows["number"].astype(np.uint16)
+    idx, n_draws, last_date = draw_index(rows["date"])
+
+    # 每期出现的号码矩阵 (期数 × 10000)，用于重复率
+    present = np.zeros((n_draws, 10000), dtype=bool)
+    present[idx, numbers] = True
+
+    frequency = np.bincount(numbers, minlength=10000)
+    recent_mask = idx >= n_draws - recent
+    recent_frequency = np.bincount(numbers[recent_mask], minlength=10000)
+
+    last_seen = np.full(10000, -1, dtype=np.int64)
+    np.maximum.at(last_seen, numbers, idx)
+    gap = np.where(last_seen >= 0, n_draws - 1 - last_seen, -1)
+
+    digits = (numbers[:, None] // np.array([1000, 100, 10, 1], dtype=np.uint16)) % 10
+    position_frequency = np.stack([np.bincount(digits[:, p], minlength=10) for p in range(4)])
+
+    repeats = (present[1:] & present[:-1]).sum(axis=1)
+    drawn = present[1:].sum(axis=1)
+    seen = gap >= 0
+    summary = {
+        "kind": "4d",
+        "draws": n_draws,
+        "last_date": last_date,
+        "recent_draws": min(recent, n_draws),
+        "hot": top(recent_frequency, TOP_N),
+        "cold": top(gap[seen], TOP_N, numbers=np.flatnonzero(seen)),
+        "never_seen": int((~seen).sum()),
+        "position_frequency": position_frequency.tolist(),
+        "repeat_rate": float(repeats.sum() / drawn.sum()) if drawn.sum() else 0.0,
+        "draws_with_repeat": float((repeats > 0).mean()) if len(repeats) else 0.0,
+    }
+    per_number = {"frequency": frequency.tolist(), "gap": gap.tolist()}
+    return summary, per_number
+
+
+def lotto_stats(rows, recent):
+    """乐透号码按期压成 64 位掩码后统计，返回 {玩法: 统计}"""
+    games = {}
+    for tier, name in LOTTO_TIERS.items():
+        game = rows[rows["tier"] == tier]
+        if not len(game):
+            continue
+        idx, n_draws, last_date = draw_index(game["date"])
+        balls = game["number"].astype(np.uint64)
+        masks = np.zeros(n_draws, dtype=np.uint64)
+        np.bitwise_or.at(masks, idx, np.left_shift(np.uint64(1), balls))
+        bits = ((masks[:, None] >> BALL_BITS) & np.uint64(1)).astype(bool)
+        max_ball = int(balls.max())
+
+        frequency = bits.sum(axis=0)[:max_ball + 1]
+        recent_frequency = bits[-recent:].sum(axis=0)[:max_ball + 1]
+        ever = bits.any(axis=0)
+        last_seen = np.where(ever, n_draws - 1 - np.argmax(bits[::-1], axis=0), -1)[:max_ball + 1]
+        gap = np.where(last_seen >= 0, n_draws - 1 - last_seen, -1)
+        repeats = (bits[1:] & bits[:-1]).sum(axis=1)
+        drawn = bits[1:].sum()
+        seen = np.flatnonzero(gap[1:] >= 0) + 1   # 球号从 1 开始
+        games[name] = {
+            "draws": n_draws,
+            "last_date": last_date,
+            "recent_draws": min(recent, n_draws),
+            "hot": top(recent_frequency[1:], TOP_N, numbers=np.arange(1, max_ball + 1), width=1),
+            "cold": top(gap[seen], TOP_N, numbers=seen, width=1),
+            "frequency": frequency[1:].tolist(),
+            "gap": gap[1:].tolist(),
+            "repeat_rate": float(repeats.sum() / drawn) if drawn else 0.0,
+        }
+    return games
+
+
+def first_prize_stats(rows):
+    """5D / 6D 头奖各位数字频率"""
+    result = {}
+    for tier, name in FIRST_PRIZE_TIERS.items():
+        first = rows[(rows["tier"] == tier) & (rows["width"] == int(name[0]))]
+        if not len(first):
+            continue
+        width = int(name[0])
+        divisors = 10 ** np.arange(width - 1, -1, -1, dtype=np.uint32)
+        digits = (first["number"][:, None] // divisors) % 10
+        result[name] = {
+            "draws": len(np.unique(first["date"])),
+            "position_frequency": np.stack([np.bincount(digits[:, p], minlength=10)
+                                            for p in range(width)]).tolist(),
+        }
+    return result
+
+
+def build_stats(rows, recent):
+    """返回 {公司: (汇总, 逐号码数据或 None)}"""
+    stats = {}
+    for company_id, company in enumerate(crawler.ARCHIVE_COMPANIES):
+        company_rows = rows[rows["company"] == company_id]
+        if not len(company_rows):
+            continue
+        four_d = company_rows[np.isin(company_rows["tier"], FOUR_D_TIERS) & (company_rows["width"] == 4)]
+        if len(four_d):
+            stats[company] = four_d_stats(four_d, recent)
+            continue
+        games = lotto_stats(company_rows, recent)
+        if games:
+            stats[company] = ({"kind": "lotto", "games": games}, None)
+            continue
+        first = first_prize_stats(company_rows)
+        if first:
+            stats[company] = ({"kind": "first_prize", "games": first}, None)
+    return stats
+
+
+def write_json(path, data):
+    if crawler.write_published(path, crawler.dump_json(data)):
+        print(f"📊 已更新统计文件: {path}")
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须是正整数: {value}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从列式历史库生成号码统计 JSON")
+    parser.add_argument("--recent", type=positive_int, default=100, help="热号统计的最近期数（至少 1）")
+    args = parser.parse_args(argv)
+
+    rows = load_rows()
+    if not len(rows):
+        print("ℹ️ 列式历史库为空，跳过统计")
+        return
+    os.makedirs(STATS_DIR, exist_ok=True)
+    stats = build_stats(rows, args.recent)
+    for company, (summary, per_number) in stats.items():
+        write_json(os.path.join(STATS_DIR, f"{company}.json"), summary)
+        if per_number:
+            write_json(os.path.join(STATS_DIR, f"{company}_numbers.json"), per_number)
+    write_json(os.path.join(STATS_DIR, "index.json"), sorted(stats))
+    crawler.update_publish_manifest()
+    print(f"📊 共 {len(rows)} 条记录，生成 {len(stats)} 家公司的统计")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+用仓库里的 fixtures/ 回放各数据源页面：每个已安装的解析后端的提取结果须与 html.parser 完全一致
+（即 bench.py parsers --fixtures fixtures），html.parser 提取出的结果须完整并通过保存前的校验
+
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import unittest
+
+import bench
+import crawler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, bench.FIXTURES_DIR)
+
+# fixtures 中各数据源应提取到的公司
+EXPECTED_COMPANIES = {
+    "4d4d": {"damacai", "damacai_1p3d", "magnum", "toto", "singapore", "sabah", "sandakan",
+             "sarawak_cashsweep", "sportstoto_5d", "sportstoto_6d", "sportstoto_lotto"},
+    "4dlatest": {"grand_dragon", "sabah_lotto", "magnum_jackpot_gold", "magnum_life",
+                 "sportstoto_5d", "sportstoto_6d", "sportstoto_lotto"},
+}
+
+
+class FixtureParsersTest(unittest.TestCase):
+    def setUp(self):
+        crawler.use_fixtures(FIXTURES)
+
+    def tearDown(self):
+        crawler._fixtures = None
+        crawler.HTML_PARSER = bench.REFERENCE_BACKEND
+
+    def extract(self, name):
+        url, extract = bench.SOURCES[name]
+        with bench.quiet():
+            return extract(crawler.make_soup(crawler.fetch_html(url), bench.REFERENCE_BACKEND))
+
+    def test_backends_agree(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            code = bench.main(["parsers", "--fixtures", FIXTURES, "--repeat", "1"])
+        self.assertEqual(code, 0, out.getvalue())
+        for name in bench.SOURCES:
+            self.assertIn(f"📄 {name}", out.getvalue())
+
+    def test_results_complete_and_valid(self):
+        for name, companies in EXPECTED_COMPANIES.items():
+            results = self.extract(name)
+            self.assertEqual(set(results), companies)
+            for company, result in results.items():
+                with self.subTest(source=name, company=company):
+                    self.assertEqual(crawler.validate_result(company, result), [])
+                    self.assertTrue(crawler.result_complete(company, result.to_dict(), name))
+
+    def test_extracted_numbers(self):
+        four_d = self.extract("4d4d")
+        self.assertEqual(four_d["magnum"].to_dict()["1st"], "2580")
+        self.assertEqual(four_d["damacai_1p3d"].to_dict()["special"][0], "221 809")
+        self.assertEqual(four_d["sabah"].to_dict()["3d"], {"1st": "094", "2nd": "312", "3rd": "654"})
+        self.assertEqual(four_d["sportstoto_lotto"].to_dict()["supreme"], ["4", "5", "13", "17", "22", "54"])
+        latest = self.extract("4dlatest")
+        self.assertEqual(latest["sportstoto_6d"].to_dict()["2nd"], {"main": "53820", "alt": "38201"})
+        self.assertEqual(latest["sportstoto_lotto"].to_dict()["star"], ["2", "5", "10", "25", "28", "47", "26"])
+        self.assertEqual(self.extract("4d2ulive")["grand_dragon"]["draw_date"], "07-03-2026")
+
+    def test_singapore_toto(self):
+        with bench.quiet():
+            link = crawler.extract_singapore_toto_link(crawler.make_soup(crawler.fetch_html(crawler.URL_SG_TOTO)))
+            data = crawler.fetch_singapore_toto_draw(link)
+        self.assertEqual(link, crawler.sg_toto_draw_link(4162))
+        self.assertEqual(data.draw_no, "4162")
+        self.assertEqual(crawler.validate_result("singapore_toto", data), [])
+        self.assertTrue(data.complete)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+docs/data 下已保存的结果都必须通过 crawler.validate_result 的校验，否则同样的结果再次抓到时
+会被隔离，对应的文件从此不再更新
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import unittest
+
+import crawler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, crawler.DATA_DIR)
+
+
+def saved_results():
+    """[(路径, 公司, 数据)]：最新文件及每日归档中爬虫会校验的公司（sportstoto_fireball 为静态文件，不经过爬虫）"""
+    results = []
+    for root, _, names in os.walk(DATA_DIR):
+        for name in sorted(names):
+            company = name[:-len(".json")]
+            if name.endswith(".json") and company in crawler.COMPANY_SOURCES:
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as f:
+                    results.append((path, company, json.load(f)))
+    return results
+
+
+class SavedResultsTest(unittest.TestCase):
+    def test_saved_results_pass_validation(self):
+        results = saved_results()
+        self.assertTrue(results)
+        for path, company, data in results:
+            with self.subTest(path=os.path.relpath(path, ROOT)):
+                self.assertEqual(crawler.validate_result(company, crawler.result_from_dict(company, data)), [])
+
+    def test_damacai_1p3d_format(self):
+        data = crawler.load_state(os.path.join(DATA_DIR, "damacai_1p3d.json"))
+        result = crawler.result_from_dict("damacai_1p3d", dict(data, **{"1st": "9260 64"}))
+        self.assertEqual(crawler.validate_result("damacai_1p3d", result), ["头三奖 '9260 64' 不是 NNN NNN 格式"])
+
+    def test_lotto_game_not_drawn(self):
+        data = crawler.load_state(os.path.join(DATA_DIR, "2026-02-28", "sportstoto_lotto.json"))
+        self.assertEqual(data["supreme"], [crawler.NOT_DRAWN] * 6)
+        result = crawler.result_from_dict("sportstoto_lotto", data)
+        self.assertEqual(crawler.validate_result("sportstoto_lotto", result), [])
+        self.assertTrue(result.complete)
+        result.games["power"][0] = crawler.NOT_DRAWN   # 只有部分号码是 "-" 时仍按非数字处理
+        self.assertTrue(crawler.validate_result("sportstoto_lotto", result))
+
+    def test_result_type_matches_company(self):
+        data = crawler.load_state(os.path.join(DATA_DIR, "magnum.json"))
+        result = crawler.result_from_dict("magnum", data)
+        self.assertEqual(crawler.validate_result("magnum_life", result),
+                         ["结果类型 FourDResult 与 magnum_life 应有的 LottoResult 不符"])
+
+
+if __name__ == "__main__":
+    unittest.main()